@@ -0,0 +1,95 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, RedirectResponse
+import json
+import os
+from typing import Optional
+
+from build_assets import FORMATS, OUTPUT_DIR, SOURCE_DIR
+
+# Serves the images produced by build_assets.py.
+#   /assets/images/<name>?w=640   picks format (Accept) and width and redirects to the
+#                                 variant; the redirect is cached for a day
+#   /assets/h/<hashed name>       a specific variant; content-hashed, so cached forever
+# Browsers keep the variant itself across rebuilds that do not change the image,
+# and only the small redirect is fetched again.
+# Before the build has run, /assets/images falls back to the original files.
+
+router = APIRouter()
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+NEGOTIATED = "public, max-age=86400"
+
+MEDIA_TYPES = {ext: media_type for ext, media_type, _ in FORMATS}
+
+_manifest = None
+_manifest_mtime = None
+
+def get_manifest():
+    # Reloaded when build_assets.py rewrites it, no restart needed
+    global _manifest, _manifest_mtime
+    path = os.path.join(OUTPUT_DIR, "manifest.json")
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return {}
+    if mtime != _manifest_mtime:
+        with open(path) as f:
+            _manifest = json.load(f)
+        _manifest_mtime = mtime
+    return _manifest
+
+def pick_variant(entry, accept: str, width: Optional[int]):
+    for _, media_type, _ in FORMATS:
+        variants = entry["variants"].get(media_type)
+        # PNG is the fallback every browser takes
+        if not variants or (media_type != "image/png" and media_type not in accept):
+            continue
+        widths = sorted(int(w) for w in variants)
+        # Smallest variant at least as wide as requested, else the largest one
+        chosen = next((x for x in widths if x >= width), widths[-1]) if width else widths[-1]
+        return variants[str(chosen)], media_type
+    return None, None
+
+def precompressed_response(path: str, request: Request, media_type: str, headers: dict):
+    # Serves path.br / path.gz when the client accepts it and the build produced one
+    accept_encoding = request.headers.get("accept-encoding", "")
+    headers = {**headers, "Vary": "Accept-Encoding"}
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if encoding in accept_encoding and os.path.exists(path + suffix):
+            headers["Content-Encoding"] = encoding
+            return FileResponse(path + suffix, media_type=media_type, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+@router.get("/images/{name}")
+async def negotiated_image(name: str, request: Request, w: Optional[int] = None):
+    entry = get_manifest().get(name)
+    if entry is None:
+        original = os.path.join(SOURCE_DIR, os.path.basename(name))
+        if not os.path.isfile(original):
+            raise HTTPException(status_code=404, detail="Asset not found")
+        return FileResponse(original, headers={"Cache-Control": "no-cache"})
+
+    filename, _ = pick_variant(entry, request.headers.get("accept", ""), w)
+    # Relative, so it resolves under whatever prefix the proxy mounts /assets at.
+    # 302 and not 301: the target changes with the Accept header and with each build.
+    return RedirectResponse(
+        f"../h/{filename}",
+        status_code=302,
+        headers={"Cache-Control": NEGOTIATED, "Vary": "Accept"}
+    )
+
+@router.get("/h/{filename}")
+async def hashed_asset(filename: str):
+    media_type = MEDIA_TYPES.get(os.path.splitext(filename)[1].lstrip("."))
+    path = os.path.join(OUTPUT_DIR, os.path.basename(filename))
+    if media_type is None or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Asset not found")
+    # FileResponse sends the file itself (sendfile/pathsend where the server supports it)
+    return FileResponse(path, media_type=media_type, headers={"Cache-Control": IMMUTABLE})
+
+@router.get("/manifest.json")
+async def manifest(request: Request):
+    path = os.path.join(OUTPUT_DIR, "manifest.json")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Assets have not been built")
+    return precompressed_response(path, request, "application/json", {"Cache-Control": "no-cache"})
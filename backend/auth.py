@@ -0,0 +1,120 @@
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from functools import lru_cache
+from typing import NamedTuple
+import os
+import time
+
+import jwt
+
+# Stateless auth for the SQLAlchemy backend (main.py).
+# Access tokens are short lived and carry everything a request needs (user id and role),
+# so checking them never touches the database. Refresh tokens live longer and are only
+# accepted by /auth/refresh.
+SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
+ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+# For RS*/ES* algorithms, PEM files with the key pair
+PRIVATE_KEY_FILE = os.getenv("JWT_PRIVATE_KEY_FILE")
+PUBLIC_KEY_FILE = os.getenv("JWT_PUBLIC_KEY_FILE")
+
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 14))
+
+# Number of verified access tokens remembered per worker
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 4096))
+
+
+class TokenClaims(NamedTuple):
+    user_id: int
+    role: str
+    expires_at: int
+
+
+# Parsing key material (especially PEM) is far more expensive than checking a
+# signature, so each key is prepared once per process
+@lru_cache(maxsize=None)
+def _signing_key():
+    if PRIVATE_KEY_FILE:
+        with open(PRIVATE_KEY_FILE, "rb") as f:
+            return jwt.get_algorithm_by_name(ALGORITHM).prepare_key(f.read())
+    return jwt.get_algorithm_by_name(ALGORITHM).prepare_key(SECRET_KEY)
+
+@lru_cache(maxsize=None)
+def _verifying_key():
+    if PUBLIC_KEY_FILE:
+        with open(PUBLIC_KEY_FILE, "rb") as f:
+            return jwt.get_algorithm_by_name(ALGORITHM).prepare_key(f.read())
+    return _signing_key()
+
+
+def _create_token(user_id: int, role: str, token_type: str, expires_delta: timedelta) -> str:
+    expire = datetime.now(timezone.utc) + expires_delta
+    payload = {"sub": str(user_id), "role": role, "type": token_type, "exp": expire}
+    return jwt.encode(payload, _signing_key(), algorithm=ALGORITHM)
+
+def create_access_token(user_id: int, role: str) -> str:
+    return _create_token(user_id, role, "access", timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+
+def create_refresh_token(user_id: int, role: str) -> str:
+    return _create_token(user_id, role, "refresh", timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+
+def issue_tokens(user) -> dict:
+    return {
+        "access_token": create_access_token(user.id, user.role),
+        "refresh_token": create_refresh_token(user.id, user.role),
+        "token_type": "bearer",
+    }
+
+
+def decode_token(token: str, token_type: str) -> TokenClaims:
+    try:
+        payload = jwt.decode(token, _verifying_key(), algorithms=[ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has expired")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+
+    if payload.get("type") != token_type or "sub" not in payload:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+    return TokenClaims(int(payload["sub"]), payload.get("role", ""), payload["exp"])
+
+
+# Clients send the same access token on every request, so the result of a
+# successful verification is kept until the token expires
+_verified_tokens = OrderedDict()
+
+def verify_access_token(token: str) -> TokenClaims:
+    claims = _verified_tokens.get(token)
+    if claims is not None:
+        if claims.expires_at > time.time():
+            _verified_tokens.move_to_end(token)
+            return claims
+        del _verified_tokens[token]
+
+    claims = decode_token(token, "access")
+    _verified_tokens[token] = claims
+    if len(_verified_tokens) > TOKEN_CACHE_SIZE:
+        _verified_tokens.popitem(last=False)
+    return claims
+
+
+security = HTTPBearer(auto_error=False)
+
+# Declared async so FastAPI runs it inline instead of hopping to the threadpool
+async def get_current_claims(credentials: HTTPAuthorizationCredentials = Depends(security)) -> TokenClaims:
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return verify_access_token(credentials.credentials)
+
+def require_role(*roles):
+    async def check_role(claims: TokenClaims = Depends(get_current_claims)) -> TokenClaims:
+        if claims.role not in roles:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
+        return claims
+    return check_role
@@ -0,0 +1,307 @@
+# Online, incremental backup and restore of users, file metadata and file contents.
+#
+#   python backup.py backup <dir>     add a snapshot of everything changed since the last run
+#   python backup.py restore <dir>    load all snapshots in <dir> into an empty DATABASE_URL
+#
+# A backup directory holds
+#   blobs/<aa>/<hash>         file contents, written once per content hash
+#   snapshots/<stamp>.jsonl   rows changed and keys of rows deleted since the previous snapshot
+#   state.json                where the next incremental run starts
+#
+# Deletions are taken from the tombstones table, which keeps them for
+# TOMBSTONE_RETENTION_DAYS; incremental backups must run more often than that.
+#
+# The same records are streamed by the admin endpoint in main.py (/admin/backup).
+import argparse
+import base64
+import json
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, func, tuple_
+
+from blobstore import prune_orphan_blobs, read_hash
+from database import IS_SQLITE, SessionLocal, dialect_insert
+import models
+
+# Rows are read and restored in batches of this size
+BACKUP_BATCH_SIZE = int(os.getenv("BACKUP_BATCH_SIZE", 500))
+# Re-export rows changed shortly before the previous run: a write that started before
+# the snapshot but committed after it carries an earlier updated_at
+BACKUP_OVERLAP = timedelta(seconds=int(os.getenv("BACKUP_OVERLAP_SECONDS", 300)))
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("TOMBSTONE_RETENTION_DAYS", 90))
+
+# (model, change-tracking column) in restore order. Tables without a column are
+# small and exported in full every time.
+TABLES = [
+    (models.User, models.User.updated_at),
+    (models.Course, models.Course.updated_at),
+    (models.CourseMember, None),
+    (models.DBFile, models.DBFile.updated_at),
+    (models.FileVersion, models.FileVersion.created_at),
+]
+
+# Legacy inline contents are migrated into blobs on startup and never exported
+SKIP_COLUMNS = {"files": {"data"}}
+# Parents before children, so restoring never points parent_id at a missing row
+EXPORT_ORDER = {"files": [func.length(models.DBFile.path), models.DBFile.id]}
+
+
+def _columns(model):
+    skip = SKIP_COLUMNS.get(model.__tablename__, set())
+    return [c for c in model.__table__.columns if c.name not in skip]
+
+def _encode(row, columns):
+    record = {}
+    for column in columns:
+        value = getattr(row, column.name)
+        record[column.name] = value.isoformat() if isinstance(value, datetime) else value
+    return record
+
+def _decode(model, record):
+    for column in model.__table__.columns:
+        value = record.get(column.name)
+        if isinstance(column.type, DateTime) and isinstance(value, str):
+            record[column.name] = datetime.fromisoformat(value)
+    return record
+
+def record_deletions(db, model, keys):
+    # Call in the same transaction as the delete. Keys are primary key values,
+    # or lists of them for composite keys.
+    if keys:
+        db.bulk_insert_mappings(models.Tombstone, [
+            {"table_name": model.__tablename__, "row_key": json.dumps(key)} for key in keys
+        ])
+
+def prune_tombstones():
+    db = SessionLocal()
+    try:
+        cutoff = models.utcnow() - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+        db.query(models.Tombstone).filter(models.Tombstone.deleted_at < cutoff).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def backfill_updated_at():
+    # Rows from before change tracking existed count as changed now
+    db = SessionLocal()
+    try:
+        now = models.utcnow()
+        for model, changed_at in TABLES:
+            if changed_at is not None:
+                db.query(model).filter(changed_at.is_(None)).update({changed_at: now}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def iter_backup(since=None):
+    # Yields records from one consistent snapshot of the database:
+    # ("row", table, dict), ("deleted", table, [primary keys]), ("blob", hash, bytes)
+    # and finally ("until", iso timestamp, None) to start the next incremental run from
+    db = SessionLocal()
+    try:
+        if not IS_SQLITE:
+            db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        # On SQLite the snapshot is fixed by the first read of the transaction (WAL readers
+        # never block writers), so take the watermark before reading anything
+        started_at = models.utcnow()
+        new_hashes = set()
+
+        for model, changed_at in TABLES:
+            table = model.__tablename__
+            columns = _columns(model)
+            query = db.query(*columns)
+            if since is not None and changed_at is not None:
+                query = query.filter(changed_at > since)
+            query = query.order_by(*EXPORT_ORDER.get(table, []))
+            for row in query.execution_options(yield_per=BACKUP_BATCH_SIZE):
+                record = _encode(row, columns)
+                if record.get("content_hash"):
+                    new_hashes.add(record["content_hash"])
+                yield ("row", table, record)
+
+            # A full backup has no deletions to replay
+            if since is not None:
+                deleted = [json.loads(t.row_key) for t in db.query(models.Tombstone.row_key).filter(
+                    models.Tombstone.table_name == table,
+                    models.Tombstone.deleted_at > since
+                )]
+                if deleted:
+                    yield ("deleted", table, deleted)
+
+        for content_hash in sorted(new_hashes):
+            # Backups are not real reads and must not keep blobs hot
+            yield ("blob", content_hash, read_hash(db, content_hash, track=False))
+
+        yield ("until", (started_at - BACKUP_OVERLAP).isoformat(), None)
+    finally:
+        db.close()
+
+def iter_backup_ndjson(since=None):
+    # Wire format of /admin/backup: one JSON object per line, blob bytes base64 encoded
+    for kind, key, value in iter_backup(since):
+        if kind == "row":
+            line = {"type": "row", "table": key, "row": value}
+        elif kind == "deleted":
+            line = {"type": "deleted", "table": key, "keys": value}
+        elif kind == "blob":
+            line = {"type": "blob", "hash": key, "data": base64.b64encode(value).decode("ascii")}
+        else:
+            line = {"type": "until", "since": key}
+        yield (json.dumps(line) + "\n").encode("utf-8")
+
+
+def _blob_path(directory, content_hash):
+    return os.path.join(directory, "blobs", content_hash[:2], content_hash)
+
+def backup_to_directory(directory):
+    os.makedirs(os.path.join(directory, "snapshots"), exist_ok=True)
+    state_path = os.path.join(directory, "state.json")
+    since = None
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            since = datetime.fromisoformat(json.load(f)["since"])
+
+    stamp = models.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    snapshot_path = os.path.join(directory, "snapshots", f"{stamp}.jsonl")
+    rows = blobs = 0
+    with open(snapshot_path + ".partial", "w") as snapshot:
+        for kind, key, value in iter_backup(since):
+            if kind == "row":
+                snapshot.write(json.dumps({"table": key, "row": value}) + "\n")
+                rows += 1
+            elif kind == "deleted":
+                snapshot.write(json.dumps({"table": key, "deleted": value}) + "\n")
+            elif kind == "blob":
+                path = _blob_path(directory, key)
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path + ".partial", "wb") as f:
+                        f.write(value)
+                    os.replace(path + ".partial", path)
+                    blobs += 1
+            else:
+                until = key
+    # Only complete snapshots are visible to restore
+    os.replace(snapshot_path + ".partial", snapshot_path)
+    with open(state_path, "w") as f:
+        json.dump({"since": until}, f)
+    prune_tombstones()
+    print(f"Backed up {rows} changed rows and {blobs} new blobs to {snapshot_path}")
+
+
+def _upsert(db, model, records):
+    if not records:
+        return
+    stmt = dialect_insert(model).values(records)
+    keys = [c.name for c in model.__table__.primary_key.columns]
+    updates = {c.name: stmt.excluded[c.name] for c in _columns(model) if c.name not in keys}
+    if updates:
+        stmt = stmt.on_conflict_do_update(index_elements=keys, set_=updates)
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=keys)
+    db.execute(stmt)
+
+def _load_blobs(db, directory, hashes):
+    # Contents must exist before the rows that reference them
+    hashes = sorted(hashes)
+    loaded = set()
+    for i in range(0, len(hashes), BACKUP_BATCH_SIZE):
+        chunk = hashes[i:i + BACKUP_BATCH_SIZE]
+        present = {h for (h,) in db.query(models.FileBlob.hash).filter(models.FileBlob.hash.in_(chunk))}
+        batch = []
+        for content_hash in chunk:
+            if content_hash in present:
+                continue
+            with open(_blob_path(directory, content_hash), "rb") as f:
+                data = f.read()
+            batch.append({"hash": content_hash, "size": len(data), "data": data})
+        if batch:
+            db.execute(dialect_insert(models.FileBlob).values(batch).on_conflict_do_nothing(index_elements=["hash"]))
+            loaded.update(b["hash"] for b in batch)
+    return loaded
+
+def _delete_rows(db, model, keys):
+    columns = list(model.__table__.primary_key.columns)
+    keys = [tuple(k) if isinstance(k, list) else (k,) for k in keys]
+    if model is models.DBFile:
+        # Children before parents: deepest paths first
+        paths = {}
+        for i in range(0, len(keys), BACKUP_BATCH_SIZE):
+            ids = [k[0] for k in keys[i:i + BACKUP_BATCH_SIZE]]
+            paths.update(db.query(models.DBFile.id, models.DBFile.path).filter(models.DBFile.id.in_(ids)))
+        keys.sort(key=lambda k: len(paths.get(k[0]) or ""), reverse=True)
+    for i in range(0, len(keys), BACKUP_BATCH_SIZE):
+        db.query(model).filter(
+            tuple_(*columns).in_(keys[i:i + BACKUP_BATCH_SIZE])
+        ).delete(synchronize_session=False)
+
+def restore_from_directory(directory):
+    snapshot_dir = os.path.join(directory, "snapshots")
+    snapshots = sorted(f for f in os.listdir(snapshot_dir) if f.endswith(".jsonl"))
+    if not snapshots:
+        print("No snapshots found")
+        return
+
+    models_by_table = {model.__tablename__: model for model, _ in TABLES}
+    loaded = set()
+    db = SessionLocal()
+    try:
+        # Replay oldest to newest so later row versions win. Each snapshot is read twice:
+        # first for the blobs its rows need and its deletions, then for the rows.
+        for name in snapshots:
+            path = os.path.join(snapshot_dir, name)
+            hashes = set()
+            deleted = {}
+            with open(path) as snapshot:
+                for line in snapshot:
+                    record = json.loads(line)
+                    if "deleted" in record:
+                        deleted.setdefault(record["table"], []).extend(record["deleted"])
+                    elif record["row"].get("content_hash"):
+                        hashes.add(record["row"]["content_hash"])
+            loaded |= _load_blobs(db, directory, hashes)
+
+            # Deletions first: a deleted id may have been reused by a row in this snapshot.
+            # Dependent tables before the tables they point at.
+            for model, _ in reversed(TABLES):
+                if model.__tablename__ in deleted:
+                    _delete_rows(db, model, deleted[model.__tablename__])
+
+            # Rows come table by table in dependency order, parents first (see EXPORT_ORDER)
+            batch_table, batch = None, []
+            with open(path) as snapshot:
+                for line in snapshot:
+                    record = json.loads(line)
+                    if "deleted" in record:
+                        continue
+                    table = record["table"]
+                    if table != batch_table or len(batch) >= BACKUP_BATCH_SIZE:
+                        if batch:
+                            _upsert(db, models_by_table[batch_table], batch)
+                        batch_table, batch = table, []
+                    batch.append(_decode(models_by_table[table], record["row"]))
+            if batch:
+                _upsert(db, models_by_table[batch_table], batch)
+            db.commit()
+        # Contents only referenced by rows deleted in a later snapshot
+        prune_orphan_blobs(db, loaded)
+        db.commit()
+        print(f"Restored {len(snapshots)} snapshots and {len(loaded)} blobs")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backup and restore the file store")
+    parser.add_argument("command", choices=["backup", "restore"])
+    parser.add_argument("directory")
+    args = parser.parse_args()
+
+    from database import migrate_schema
+    migrate_schema()
+    if args.command == "backup":
+        backup_to_directory(args.directory)
+    else:
+        restore_from_directory(args.directory)
@@ -0,0 +1,68 @@
+# Compares ways of serializing a large folder listing (GET /files/list).
+#
+#   python bench_listing.py [rows] [repeats]
+#
+# "dicts" is the previous implementation: one dict per row, run through FastAPI's
+# jsonable_encoder and the standard json module. The others are what serialization.py does.
+import json
+import sys
+import time
+from collections import namedtuple
+
+from fastapi.encoders import jsonable_encoder
+import msgspec
+
+from serialization import file_item, format_size
+
+Row = namedtuple("Row", "id filename size content_type is_folder parent_id")
+
+
+def make_rows(count):
+    return [
+        Row(i, f"folder-{i}", 0, None, True, 1) if i % 10 == 0
+        else Row(i, f"lecture-notes-{i}.pdf", i * 1337, "application/pdf", False, 1)
+        for i in range(count)
+    ]
+
+def as_dicts(rows):
+    files = []
+    for f in rows:
+        files.append({
+            "id": f.id,
+            "name": f.filename,
+            "size": "-" if f.is_folder else format_size(f.size or 0),
+            "type": "folder" if f.is_folder else f.content_type,
+            "is_folder": f.is_folder,
+            "parent_id": f.parent_id,
+        })
+    return json.dumps(jsonable_encoder(files)).encode("utf-8")
+
+json_encoder = msgspec.json.Encoder()
+msgpack_encoder = msgspec.msgpack.Encoder()
+
+def as_json(rows):
+    return json_encoder.encode([file_item(f) for f in rows])
+
+def as_msgpack(rows):
+    return msgpack_encoder.encode([file_item(f) for f in rows])
+
+
+def bench(name, fn, rows, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        body = fn(rows)
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<10} {best * 1000:8.2f} ms  {len(body):>10} bytes")
+    return body
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    rows = make_rows(count)
+    print(f"{count} rows, best of {repeats}")
+    baseline = bench("dicts", as_dicts, rows, repeats)
+    fast = bench("msgspec", as_json, rows, repeats)
+    bench("msgpack", as_msgpack, rows, repeats)
+    assert json.loads(baseline) == json.loads(fast), "outputs differ"
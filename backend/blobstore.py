@@ -0,0 +1,67 @@
+import hashlib
+
+from sqlalchemy import select
+
+from database import SessionLocal, dialect_insert
+import models
+import tiering
+
+# Content-addressed file storage. DBFile rows only point at a blob by hash, so
+# copies and unchanged re-uploads share the same bytes.
+
+def hash_contents(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def put_blob(db, data: bytes, content_hash: str) -> str:
+    # Hash with hash_contents before taking the write queue; hashing a large
+    # upload on the writer thread would hold up every other write
+    stmt = dialect_insert(models.FileBlob).values(hash=content_hash, size=len(data), data=data)
+    # Uploading contents that were archived brings them back to the hot tier
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["hash"],
+        set_={"data": stmt.excluded.data, "tier": tiering.HOT, "last_accessed_at": models.utcnow()},
+        where=models.FileBlob.tier == tiering.COLD
+    ))
+    return content_hash
+
+def read_blob(db, db_file) -> bytes:
+    if db_file.content_hash is None:
+        return db_file.data or b""
+    return read_hash(db, db_file.content_hash)
+
+def read_hash(db, content_hash: str, track=True) -> bytes:
+    # Served from memory, the database or the archive (see tiering.py); `track`
+    # counts the read towards keeping the blob hot
+    return tiering.load(db, content_hash, track)
+
+def prune_orphan_blobs(db, hashes):
+    # Only the given candidates are checked, so this never scans the whole blob table
+    hashes = {h for h in hashes if h}
+    if not hashes:
+        return
+    used_by_files = select(models.DBFile.content_hash).where(models.DBFile.content_hash.in_(hashes))
+    used_by_versions = select(models.FileVersion.content_hash).where(models.FileVersion.content_hash.in_(hashes))
+    db.query(models.FileBlob).filter(
+        models.FileBlob.hash.in_(hashes),
+        models.FileBlob.hash.not_in(used_by_files),
+        models.FileBlob.hash.not_in(used_by_versions)
+    ).delete(synchronize_session=False)
+
+def migrate_legacy_content(batch_size=100):
+    # Moves contents stored inline on files rows into blobs; a no-op once done
+    db = SessionLocal()
+    try:
+        while True:
+            rows = db.query(models.DBFile).filter(
+                models.DBFile.content_hash.is_(None),
+                models.DBFile.is_folder == False,
+                models.DBFile.data.isnot(None)
+            ).limit(batch_size).all()
+            if not rows:
+                break
+            for row in rows:
+                row.content_hash = put_blob(db, row.data, hash_contents(row.data))
+                row.data = None
+            db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,98 @@
+# Builds the optimized images served by assets.py.
+#
+#   python build_assets.py [source_dir] [output_dir]
+#
+# Every source image gets responsive widths in AVIF (when Pillow supports it), WebP
+# and a PNG fallback. Output names carry a hash of the source bytes
+# (chuck.3f9a1c2e.640.webp), so they can be cached forever. The manifest that maps
+# logical names to variants is written precompressed next to itself.
+import gzip
+import hashlib
+import json
+import os
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SOURCE_DIR = os.getenv("ASSET_SOURCE_DIR", os.path.join(os.path.dirname(__file__), "..", "frontend", "public", "images"))
+OUTPUT_DIR = os.getenv("ASSET_OUTPUT_DIR", os.path.join(os.path.dirname(__file__), "static", "images"))
+
+WIDTHS = [320, 640, 1280]
+SOURCE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+# Best first; assets.py serves the first one the browser accepts
+FORMATS = [
+    ("avif", "image/avif", {"quality": 55}),
+    ("webp", "image/webp", {"quality": 80, "method": 6}),
+    ("png", "image/png", {"optimize": True}),
+]
+
+
+def precompress(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+
+def build(source_dir=SOURCE_DIR, output_dir=OUTPUT_DIR):
+    # Imported here so the server can share the settings above without Pillow installed
+    from PIL import Image, features
+
+    os.makedirs(output_dir, exist_ok=True)
+    formats = [f for f in FORMATS if f[0] != "avif" or features.check("avif")]
+    manifest = {}
+    written = set()
+
+    for name in sorted(os.listdir(source_dir)):
+        if not name.lower().endswith(SOURCE_EXTENSIONS):
+            continue
+        path = os.path.join(source_dir, name)
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:8]
+        stem = os.path.splitext(name)[0]
+
+        with Image.open(path) as source:
+            source.load()
+            widths = sorted({w for w in WIDTHS if w < source.width} | {min(source.width, WIDTHS[-1])})
+            entry = {"width": source.width, "height": source.height, "variants": {}}
+            for width in widths:
+                height = round(source.height * width / source.width)
+                resized = source if width == source.width else source.resize((width, height), Image.LANCZOS)
+                for ext, media_type, options in formats:
+                    filename = f"{stem}.{digest}.{width}.{ext}"
+                    target = os.path.join(output_dir, filename)
+                    # Content-hashed names never change meaning, so existing files are reused
+                    if not os.path.exists(target):
+                        resized.save(target, **options)
+                    written.add(filename)
+                    entry["variants"].setdefault(media_type, {})[str(width)] = filename
+        manifest[name] = entry
+
+    # Drop variants of images that changed or were removed
+    for filename in os.listdir(output_dir):
+        if filename not in written and not filename.startswith("manifest.json"):
+            os.remove(os.path.join(output_dir, filename))
+
+    manifest_path = os.path.join(output_dir, "manifest.json")
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    precompress(manifest_path)
+
+    best = formats[0][1]
+    before = sum(os.path.getsize(os.path.join(source_dir, name)) for name in manifest)
+    after = sum(
+        os.path.getsize(os.path.join(output_dir, entry["variants"][best].get("640", filename)))
+        for entry in manifest.values()
+        for filename in [list(entry["variants"][best].values())[-1]]
+    )
+    print(f"Built {len(written)} variants of {len(manifest)} images into {output_dir}")
+    print(f"Originals: {before / 1024:.0f} KB, {formats[0][0]} at 640px: {after / 1024:.0f} KB")
+
+if __name__ == "__main__":
+    build(*sys.argv[1:3])
@@ -1,8 +1,13 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateIndex
 
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+from state import acquire_lease
 
 # Check for environment variable (Production vs Local)
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
@@ -11,8 +16,10 @@ SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
 if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
     SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+
 # SQLite requires specific connect_args, Postgres does not
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+if IS_SQLITE:
     connect_args = {"check_same_thread": False}
 else:
     connect_args = {}
@@ -20,6 +27,133 @@ else:
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args=connect_args
 )
+
+# SQLite performance profile, applied to every new connection.
+# Defaults are sized for a small classroom deployment and can be overridden per environment.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    # Negative values are KiB rather than pages
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", -64 * 1024)),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    "temp_store": "MEMORY",
+}
+
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        # Let SQLAlchemy emit BEGIN itself (see _begin_sqlite_transaction) instead of
+        # relying on pysqlite's implicit transaction handling
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _begin_sqlite_transaction(conn):
+        # Writer sessions take the write lock up front so they never fail on a lock upgrade
+        conn.exec_driver_sql("BEGIN " + conn.get_execution_options().get("sqlite_begin", ""))
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Sessions used by the write queue below
+WriteSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=engine.execution_options(sqlite_begin="IMMEDIATE")
+)
+
 Base = declarative_base()
+
+def dialect_insert(model):
+    # INSERT with ON CONFLICT support for the database in use
+    if IS_SQLITE:
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert(model)
+
+def migrate_schema(fixups=()):
+    # create_all only creates missing tables. Existing tables get any new
+    # (nullable) columns and indexes added in place, so older databases keep working.
+    # `fixups` run after the columns exist but before indexes are built, so they can
+    # bring old rows in line with new constraints.
+    Base.metadata.create_all(bind=engine)
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+    for fixup in fixups:
+        fixup()
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+# Single-writer queue
+# SQLite allows one writer at a time. Funnelling every write through one thread
+# serializes them in-process, while reads keep using SessionLocal in parallel.
+# Postgres handles concurrent writers itself, so it gets a regular pool.
+_write_executor = ThreadPoolExecutor(
+    max_workers=1 if IS_SQLITE else int(os.getenv("DB_WRITE_WORKERS", 8)),
+    thread_name_prefix="db-writer",
+)
+
+def _run_write(fn, *args):
+    db = WriteSessionLocal()
+    try:
+        result = fn(db, *args)
+        db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+async def run_write(fn, *args):
+    # Runs fn(session, *args) on the writer thread and commits; exceptions propagate to the caller
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_write_executor, _run_write, fn, *args)
+
+
+# Periodic maintenance
+SQLITE_CHECKPOINT_INTERVAL = int(os.getenv("SQLITE_CHECKPOINT_INTERVAL", 5 * 60))
+SQLITE_ANALYZE_INTERVAL = int(os.getenv("SQLITE_ANALYZE_INTERVAL", 6 * 60 * 60))
+# VACUUM rewrites the whole file, so it is off unless explicitly enabled
+SQLITE_VACUUM_INTERVAL = int(os.getenv("SQLITE_VACUUM_INTERVAL", 0))
+
+def _run_raw(statement):
+    # PRAGMAs and VACUUM cannot run inside a transaction, so bypass SQLAlchemy's BEGIN
+    conn = engine.raw_connection()
+    try:
+        conn.cursor().execute(statement).fetchall()
+    finally:
+        conn.close()
+
+async def sqlite_maintenance():
+    if not IS_SQLITE:
+        return
+    loop = asyncio.get_running_loop()
+    jobs = [
+        ("sqlite-checkpoint", SQLITE_CHECKPOINT_INTERVAL, ["PRAGMA wal_checkpoint(TRUNCATE)"]),
+        ("sqlite-analyze", SQLITE_ANALYZE_INTERVAL, ["PRAGMA optimize", "ANALYZE"]),
+        ("sqlite-vacuum", SQLITE_VACUUM_INTERVAL, ["VACUUM"]),
+    ]
+    while True:
+        await asyncio.sleep(SQLITE_CHECKPOINT_INTERVAL)
+        for name, interval, statements in jobs:
+            # With several workers only the lease holder runs each job
+            if not interval or not await acquire_lease(name, max(interval - 1, 1)):
+                continue
+            for statement in statements:
+                try:
+                    # Queue behind pending writes instead of competing with them for the lock
+                    await loop.run_in_executor(_write_executor, _run_raw, statement)
+                except Exception as e:
+                    print(f"SQLite maintenance '{statement}' failed: {str(e)}")
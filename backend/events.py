@@ -0,0 +1,115 @@
+import asyncio
+
+import msgspec
+
+from state import STATE_BACKEND_URL, is_shared
+
+# Folder change notifications for the SQLAlchemy backend (main.py).
+# Write endpoints publish a small event after their transaction commits; clients
+# subscribed to that folder (GET /files/events) receive it over Server-Sent Events
+# and patch their listing instead of fetching it again.
+#
+# Event types: added / updated (with the full list item), renamed (id, name),
+# removed (id), and resync, which tells a client it fell behind and should re-list.
+#
+# Within one process events are fanned out to per-subscriber queues. With
+# STATE_BACKEND_URL pointing at Redis every event goes through one pub/sub channel,
+# so subscribers on any worker see writes made on any other.
+
+CHANNEL = "file-events"
+# Events buffered per subscriber before it is considered too slow and told to resync
+SUBSCRIBER_QUEUE_SIZE = 100
+
+_encoder = msgspec.json.Encoder()
+RESYNC = _encoder.encode({"type": "resync"})
+
+
+class Subscriber:
+    def __init__(self, parent_id, user_id, course_ids):
+        self.parent_id = parent_id
+        self.user_id = user_id
+        # Courses the user belonged to when subscribing
+        self.course_ids = course_ids
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+
+    def resync(self):
+        # Pending deltas are useless once the client re-lists
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(RESYNC)
+
+    def can_read(self, owner_id, course_id):
+        # Same rule as permissions.can_read, applied to the event's item
+        return (
+            owner_id == self.user_id
+            or course_id in self.course_ids
+            or (owner_id is None and course_id is None)
+        )
+
+
+class Broadcaster:
+    def __init__(self):
+        self.subscribers = {}
+        self.redis = None
+        if is_shared():
+            import redis.asyncio as redis
+
+            self.redis = redis.from_url(STATE_BACKEND_URL)
+
+    def subscribe(self, subscriber):
+        self.subscribers.setdefault(subscriber.parent_id, set()).add(subscriber)
+
+    def unsubscribe(self, subscriber):
+        folder = self.subscribers.get(subscriber.parent_id)
+        if folder is not None:
+            folder.discard(subscriber)
+            if not folder:
+                del self.subscribers[subscriber.parent_id]
+
+    def _dispatch(self, message):
+        folder = self.subscribers.get(message["parent_id"])
+        if not folder:
+            return
+        data = _encoder.encode(message["event"])
+        for subscriber in list(folder):
+            if not subscriber.can_read(message["owner_id"], message["course_id"]):
+                continue
+            try:
+                subscriber.queue.put_nowait(data)
+            except asyncio.QueueFull:
+                # Too far behind to catch up with deltas
+                subscriber.resync()
+
+    async def publish(self, parent_id, owner_id, course_id, event):
+        message = {"parent_id": parent_id, "owner_id": owner_id, "course_id": course_id, "event": event}
+        if self.redis is None:
+            self._dispatch(message)
+            return
+        try:
+            await self.redis.publish(CHANNEL, _encoder.encode(message))
+        except Exception as e:
+            # Delivery is best effort; at least this worker's subscribers get it
+            print(f"Publishing file event failed: {str(e)}")
+            self._dispatch(message)
+
+    async def listen(self):
+        # Relays events from every worker to this worker's subscribers
+        if self.redis is None:
+            return
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(CHANNEL)
+                    async for raw in pubsub.listen():
+                        if raw["type"] == "message":
+                            self._dispatch(msgspec.json.decode(raw["data"]))
+            except Exception as e:
+                print(f"File event listener failed, reconnecting: {str(e)}")
+                # Anything published meanwhile is lost, so every client re-lists
+                for folder in list(self.subscribers.values()):
+                    for subscriber in list(folder):
+                        subscriber.resync()
+                await asyncio.sleep(1)
+
+
+broadcaster = Broadcaster()
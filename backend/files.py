@@ -1,51 +1,80 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
-import os
-import shutil
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Request
+from fastapi.responses import JSONResponse
 from typing import List
+import asyncio
+import os
+
+from stats import get_stats
+from storage import TEMP_PREFIX, get_storage
 
 router = APIRouter()
 
-UPLOAD_DIRECTORY = "./uploads"
+# Uploads handled at once by one worker. The limit is applied by UploadLimitMiddleware,
+# before the multipart body is read: FastAPI parses the whole form before it runs any
+# dependency, so a check inside the route would only start after the upload had
+# already been received and spooled to a temp file.
+MAX_CONCURRENT_UPLOADS = int(os.getenv("MAX_CONCURRENT_UPLOADS", 4))
+UPLOAD_RETRY_AFTER = int(os.getenv("UPLOAD_RETRY_AFTER_SECONDS", 5))
 
-if not os.path.exists(UPLOAD_DIRECTORY):
-    os.makedirs(UPLOAD_DIRECTORY)
+class UploadLimitMiddleware:
+    # Plain ASGI middleware for `path`: over the limit it answers 503 straight away,
+    # without receiving the body
+    def __init__(self, app, path):
+        self.app = app
+        self.path = path
+        self.slots = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+        if self.slots.locked():
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Too many uploads in progress, try again shortly"},
+                headers={"Retry-After": str(UPLOAD_RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+        async with self.slots:
+            await self.app(scope, receive, send)
 
 @router.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    file_path = os.path.join(UPLOAD_DIRECTORY, file.filename)
-    if os.path.exists(file_path):
+async def upload_file(file: UploadFile = File(...), storage=Depends(get_storage), stats=Depends(get_stats)):
+    if file.filename.startswith(TEMP_PREFIX):
+        raise HTTPException(status_code=400, detail="Invalid file name.")
+    # Cheap early rejection; save() itself refuses to overwrite an existing file
+    if await storage.exists(file.filename):
         raise HTTPException(status_code=400, detail="File with this name already exists.")
     
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    size = await storage.save(file.filename, file)
+    if stats:
+        await stats.record_upload(file.filename, size)
     
     return {"filename": file.filename, "content_type": file.content_type}
 
 @router.get("/list")
-async def list_files():
+async def list_files(storage=Depends(get_storage)):
     files = []
-    for filename in os.listdir(UPLOAD_DIRECTORY):
-        path = os.path.join(UPLOAD_DIRECTORY, filename)
-        if os.path.isfile(path):
-            files.append({
-                "name": filename,
-                "size": f"{os.path.getsize(path) / 1024:.2f} KB",
-                "type": filename.split('.')[-1]
-            })
+    for entry in await storage.list():
+        files.append({
+            "name": entry["name"],
+            "size": f"{entry['size'] / 1024:.2f} KB",
+            "type": entry["name"].split('.')[-1]
+        })
     return files
 
 @router.get("/download/{filename}")
-async def download_file(filename: str):
-    file_path = os.path.join(UPLOAD_DIRECTORY, filename)
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(path=file_path, media_type='application/octet-stream', filename=filename)
+async def download_file(filename: str, request: Request, storage=Depends(get_storage)):
+    return await storage.download(filename, request)
 
 @router.delete("/delete/{filename}")
-async def delete_file(filename: str):
-    file_path = os.path.join(UPLOAD_DIRECTORY, filename)
-    if not os.path.exists(file_path):
+async def delete_file(filename: str, storage=Depends(get_storage), stats=Depends(get_stats)):
+    size = await storage.delete(filename)
+    if size is None:
         raise HTTPException(status_code=404, detail="File not found")
-    os.remove(file_path)
-    return {"message": f"File '{filename}' deleted successfully."}
\ No newline at end of file
+    if stats:
+        await stats.record_delete(filename, size)
+    return {"message": f"File '{filename}' deleted successfully."}
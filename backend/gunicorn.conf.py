@@ -0,0 +1,44 @@
+# Multi-worker launcher for the SQLAlchemy backend:
+#   gunicorn -c gunicorn.conf.py main:app
+#
+# Deploying new code: because of preload_app the master already holds the app, and
+# `kill -HUP` only replaces workers with copies of that same code (useful for config
+# or memory, not for releases). To switch to a new release without downtime run
+# `kill -USR2 <master pid>`, which starts a new master from the new code, then
+# `kill -TERM <old master pid>` once its workers are up; or simply restart the service.
+# Anything that has to be shared between workers must go through state.py, so more
+# than one worker needs STATE_BACKEND_URL=redis://...; without it the default is a
+# single worker and asking for more refuses to start.
+import multiprocessing
+import os
+
+from state import check_workers, is_shared
+
+bind = os.getenv("BIND", "127.0.0.1:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() if is_shared() else 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Import the app once in the master so workers fork with it already loaded
+# (see above for what that means for reloads)
+preload_app = True
+
+# Give in-flight uploads time to finish on reload/shutdown
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.getenv("WORKER_TIMEOUT", 120))
+keepalive = 5
+
+# Recycle workers now and then to cap memory growth
+max_requests = int(os.getenv("MAX_REQUESTS", 5000))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", 500))
+
+
+def on_starting(server):
+    check_workers(server.cfg.workers)
+
+
+def post_fork(server, worker):
+    # Database connections opened in the master (preload_app) must not be shared
+    # with the forked workers
+    from database import engine
+
+    engine.dispose(close=False)
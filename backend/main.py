@@ -1,20 +1,44 @@
-from fastapi import FastAPI, HTTPException, status, UploadFile, File, Depends
+from fastapi import FastAPI, HTTPException, status, UploadFile, File, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from pydantic import BaseModel
+from sqlalchemy import and_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
 import os
 import shutil
 from typing import List, Optional
+from datetime import datetime
 
-from database import SessionLocal, engine, Base
+import asyncio
+import time
+import msgspec
+
+from database import SessionLocal, dialect_insert, migrate_schema, run_write, sqlite_maintenance
 import models
+from ratelimit import check_login_rate
+from state import check_workers
+from auth import TokenClaims, decode_token, get_current_claims, issue_tokens, require_role, verify_access_token
+from permissions import can_read, can_write, is_course_member, member_course_ids
+from blobstore import hash_contents, migrate_legacy_content, put_blob, read_blob
+from tree import backfill_paths, child_path, is_within, rebase_subtree, rename_duplicate_siblings, subtree_filter, use_byte_order_paths
+from versions import backfill_versions, record_version
+from backup import backfill_updated_at, iter_backup_ndjson
+from assets import router as assets_router
+from serialization import FileItem, MsgspecJSONResponse, encode_response, file_item
+from events import Subscriber, broadcaster
+from tiering import backfill_access_times, flush_access_stats, tier_cold_blobs, track_access
+from trash import drop_legacy_name_index, purge_expired_trash, restore_subtree, retention, trash_subtree
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Create database tables (and add columns introduced since the database was created)
+migrate_schema(fixups=[
+    use_byte_order_paths, backfill_paths, drop_legacy_name_index, rename_duplicate_siblings, migrate_legacy_content,
+    backfill_versions, backfill_updated_at, backfill_access_times
+])
 
-app = FastAPI()
+app = FastAPI(default_response_class=MsgspecJSONResponse)
 
 # Password Hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -43,12 +67,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(IntegrityError)
+async def integrity_error_handler(request: Request, exc: IntegrityError):
+    # Unique name constraint hit by a concurrent change
+    return JSONResponse(status_code=409, content={"detail": "An item with this name already exists here"})
+
 @app.on_event("startup")
 async def startup_event():
+    # Keep the SQLite WAL and query planner statistics in shape while serving
+    asyncio.create_task(sqlite_maintenance())
+    asyncio.create_task(broadcaster.listen())
+    asyncio.create_task(purge_expired_trash())
+    asyncio.create_task(track_access())
+    asyncio.create_task(tier_cold_blobs())
     print("Backend server is ready at http://127.0.0.1:8000")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Keep the reads counted since the last flush
+    await flush_access_stats()
+
 # UPLOAD_DIR logic removed as files are stored in DB
 
+# Optimized static images (see build_assets.py)
+app.include_router(assets_router, prefix="/assets", tags=["assets"])
+
 # Pydantic Models
 class UserRegister(BaseModel):
     name: str
@@ -68,6 +111,14 @@ class UserResponse(BaseModel):
     class Config:
         orm_mode = True
 
+class TokenResponse(UserResponse):
+    access_token: str
+    refresh_token: str
+    token_type: str
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 # Helper Functions
 # Use pbkdf2_sha256 which is pure python and robust on Windows
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
@@ -78,35 +129,47 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def token_response(db_user):
+    # User fields stay at the top level so existing clients keep working
+    return {"name": db_user.name, "email": db_user.email, "role": db_user.role, **issue_tokens(db_user)}
+
 # Auth Endpoints
-@app.post("/auth/register", response_model=UserResponse)
-async def register(user: UserRegister, db: Session = Depends(get_db)):
+@app.post("/auth/register", response_model=TokenResponse)
+async def register(user: UserRegister, request: Request):
     print(f"Attempting to register user: {user.email}") # Debug log
+    # Admin accounts are never self-service (see manage.py create-admin)
+    if user.role not in ["student", "teacher"]:
+        raise HTTPException(status_code=400, detail="Role must be 'student' or 'teacher'")
     try:
-        # Check if user exists
-        db_user = db.query(models.User).filter(models.User.email == user.email).first()
-        if db_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already registered"
-            )
-        
-        # Hash password
+        # Hash password outside the write queue so it does not hold up other writers
         hashed_password = get_password_hash(user.password)
-        
-        # Create new user
-        new_user = models.User(
-            name=user.name,
-            email=user.email,
-            password_hash=hashed_password,
-            role=user.role
-        )
-        
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+
+        def create_user(db: Session):
+            # Check if user exists
+            db_user = db.query(models.User).filter(models.User.email == user.email).first()
+            if db_user:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Email already registered"
+                )
+
+            # Create new user
+            new_user = models.User(
+                name=user.name,
+                email=user.email,
+                password_hash=hashed_password,
+                role=user.role
+            )
+
+            db.add(new_user)
+            db.flush()
+            db.refresh(new_user)
+            db.expunge(new_user)
+            return new_user
+
+        new_user = await run_write(create_user)
         print(f"User registered successfully: {new_user.id}")
-        return new_user
+        return encode_response(request, token_response(new_user))
     except Exception as e:
         print(f"Error during registration: {str(e)}")
         # If it's already an HTTPException, re-raise it
@@ -118,19 +181,31 @@ async def register(user: UserRegister, db: Session = Depends(get_db)):
             detail=f"Registration failed: {str(e)}"
         )
 
-@app.post("/auth/login", response_model=UserResponse)
-async def login(user: UserLogin, db: Session = Depends(get_db)):
+@app.post("/auth/login", response_model=TokenResponse)
+async def login(user: UserLogin, request: Request, db: Session = Depends(get_db)):
+    # Throttle before doing any hashing work
+    await check_login_rate(request, user.email)
+
     # Find user
     db_user = db.query(models.User).filter(models.User.email == user.email).first()
     
-    # Verify
-    if not db_user or not verify_password(user.password, db_user.password_hash):
+    # Verify (off the event loop, hashing is CPU bound)
+    if not db_user or not await run_in_threadpool(verify_password, user.password, db_user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
         )
         
-    return db_user
+    return encode_response(request, token_response(db_user))
+
+@app.post("/auth/refresh", response_model=TokenResponse)
+async def refresh(body: RefreshRequest, request: Request, db: Session = Depends(get_db)):
+    claims = decode_token(body.refresh_token, "refresh")
+    # Refreshing is rare, so this is where role changes and removed accounts are picked up
+    db_user = db.query(models.User).filter(models.User.id == claims.user_id).first()
+    if not db_user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    return encode_response(request, token_response(db_user))
 
 # File Endpoints
 from fastapi.responses import StreamingResponse
@@ -142,10 +217,96 @@ class FolderCreate(BaseModel):
     name: str
     parent_id: Optional[int] = None
 
+class CourseCreate(BaseModel):
+    name: str
+
+class CourseMemberAdd(BaseModel):
+    email: str
+
+class ShareRequest(BaseModel):
+    course_id: Optional[int] = None
+
+class MoveRequest(BaseModel):
+    parent_id: Optional[int] = None
+
+class RenameRequest(BaseModel):
+    name: str
+
+class CopyRequest(BaseModel):
+    parent_id: Optional[int] = None
+    name: Optional[str] = None
+
+def get_parent(db: Session, claims: TokenClaims, parent_id: Optional[int], access=can_read):
+    # Returns (course_id, path) of the destination folder; new items inherit its course
+    # Anything that adds items to the folder must pass access=can_write
+    if parent_id is None:
+        return None, None
+    parent = db.query(models.DBFile.course_id, models.DBFile.path).filter(
+        models.DBFile.id == parent_id,
+        models.DBFile.is_folder == True,
+        access(claims)
+    ).first()
+    if not parent:
+        raise HTTPException(status_code=404, detail="Folder not found")
+    return parent.course_id, parent.path
+
+def ensure_name_free(db: Session, parent_id: Optional[int], name: str):
+    taken = db.query(models.DBFile.id).filter(
+        models.DBFile.parent_id == parent_id,
+        models.DBFile.filename == name,
+        models.DBFile.trashed_at.is_(None)
+    ).first()
+    if taken:
+        raise HTTPException(status_code=409, detail=f"An item named '{name}' already exists here")
+
+# Course Endpoints
+
+@app.post("/courses/create")
+async def create_course(course: CourseCreate, claims: TokenClaims = Depends(require_role("teacher"))):
+    def insert_course(db: Session):
+        new_course = models.Course(name=course.name, owner_id=claims.user_id)
+        db.add(new_course)
+        db.flush()
+        db.add(models.CourseMember(course_id=new_course.id, user_id=claims.user_id))
+        return new_course.id
+
+    course_id = await run_write(insert_course)
+    return {"id": course_id, "name": course.name}
+
+@app.get("/courses/list")
+async def list_courses(db: Session = Depends(get_db), claims: TokenClaims = Depends(get_current_claims)):
+    courses = db.query(models.Course.id, models.Course.name).filter(
+        models.Course.id.in_(member_course_ids(claims.user_id))
+    ).all()
+    return [{"id": c.id, "name": c.name} for c in courses]
+
+@app.post("/courses/{course_id}/members")
+async def add_course_member(
+    course_id: int,
+    member: CourseMemberAdd,
+    claims: TokenClaims = Depends(require_role("teacher"))
+):
+    def insert_member(db: Session):
+        if not is_course_member(db, claims, course_id):
+            raise HTTPException(status_code=404, detail="Course not found")
+        db_user = db.query(models.User).filter(models.User.email == member.email).first()
+        if not db_user:
+            raise HTTPException(status_code=404, detail="User not found")
+        if not db.get(models.CourseMember, (db_user.id, course_id)):
+            db.add(models.CourseMember(course_id=course_id, user_id=db_user.id))
+
+    await run_write(insert_member)
+    return {"message": "Member added"}
+
 # File/Folder Endpoints
 
 @app.get("/files/list")
-async def list_files(parent_id: Optional[int] = None, db: Session = Depends(get_db)):
+async def list_files(
+    request: Request,
+    parent_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    claims: TokenClaims = Depends(get_current_claims)
+):
     # Query items with specific parent_id (Folder browsing)
     items_db = db.query(
         models.DBFile.id,
@@ -154,115 +315,441 @@ async def list_files(parent_id: Optional[int] = None, db: Session = Depends(get_
         models.DBFile.content_type,
         models.DBFile.is_folder,
         models.DBFile.parent_id
-    ).filter(models.DBFile.parent_id == parent_id).all()
-    
-    item_list = []
-    for f in items_db:
-        if f.is_folder:
-            size_str = "-"
-            type_str = "folder"
-        else:
-            size = f.size
-            if size < 1024:
-                size_str = f"{size} B"
-            elif size < 1024 * 1024:
-                size_str = f"{size / 1024:.1f} KB"
-            else:
-                size_str = f"{size / (1024 * 1024):.1f} MB"
-            type_str = f.content_type
-
-        item_list.append({
-            "id": f.id,
-            "name": f.filename,
-            "size": size_str,
-            "type": type_str,
-            "is_folder": f.is_folder,
-            "parent_id": f.parent_id
-        })
-    return item_list
+    ).filter(models.DBFile.parent_id == parent_id, can_read(claims)).all()
 
-@app.post("/folders/create")
-async def create_folder(folder: FolderCreate, db: Session = Depends(get_db)):
-    new_folder = models.DBFile(
-        filename=folder.name,
-        content_type="application/x-directory",
-        size=0,
-        data=b"",
-        is_folder=True,
-        parent_id=folder.parent_id
+    # Rows go straight to bytes (see serialization.py); JSON or MessagePack per Accept
+    return encode_response(request, [file_item(f) for f in items_db])
+
+# How often an idle event stream sends a comment line, keeping proxies from closing it
+EVENTS_HEARTBEAT_SECONDS = int(os.getenv("EVENTS_HEARTBEAT_SECONDS", 15))
+
+@app.get("/files/events")
+async def file_events(parent_id: Optional[int] = None, access_token: str = ""):
+    # Server-Sent Events with the changes to one folder (see events.py).
+    # EventSource cannot set headers, so the access token comes in the query string.
+    claims = verify_access_token(access_token)
+    db = SessionLocal()
+    try:
+        get_parent(db, claims, parent_id)
+        course_ids = set(db.execute(member_course_ids(claims.user_id)).scalars())
+    finally:
+        db.close()
+
+    subscriber = Subscriber(parent_id, claims.user_id, course_ids)
+    broadcaster.subscribe(subscriber)
+
+    async def stream():
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    data = await asyncio.wait_for(subscriber.queue.get(), EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # End the stream once the token expires; the client reconnects with a new one
+                    if claims.expires_at <= time.time():
+                        return
+                    yield b": ping\n\n"
+                    continue
+                yield b"data: " + data + b"\n\n"
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
-    db.add(new_folder)
-    db.commit()
-    db.refresh(new_folder)
-    return {"id": new_folder.id, "name": new_folder.filename, "is_folder": True}
+
+@app.post("/folders/create")
+async def create_folder(folder: FolderCreate, claims: TokenClaims = Depends(get_current_claims)):
+    def insert_folder(db: Session):
+        course_id, parent_path = get_parent(db, claims, folder.parent_id, access=can_write)
+        ensure_name_free(db, folder.parent_id, folder.name)
+        new_folder = models.DBFile(
+            filename=folder.name,
+            content_type="application/x-directory",
+            size=0,
+            is_folder=True,
+            parent_id=folder.parent_id,
+            owner_id=claims.user_id,
+            course_id=course_id
+        )
+        db.add(new_folder)
+        db.flush()
+        new_folder.path = child_path(parent_path, new_folder.id)
+        return new_folder.id, course_id
+
+    folder_id, course_id = await run_write(insert_folder)
+    listed = FileItem(folder_id, folder.name, "-", "folder", True, folder.parent_id)
+    await broadcaster.publish(folder.parent_id, claims.user_id, course_id, {"type": "added", "item": listed})
+    # `item` lets the client show the new folder without waiting for the event
+    return {"id": folder_id, "name": folder.name, "is_folder": True, "item": msgspec.to_builtins(listed)}
 
 @app.post("/files/upload")
 async def upload_file(
     file: UploadFile = File(...), 
     parent_id: Optional[int] = Form(None),
-    db: Session = Depends(get_db)
+    claims: TokenClaims = Depends(get_current_claims)
 ):
     request_object_content = await file.read()
-    
-    # Check if exists in this specific folder
-    existing_file = db.query(models.DBFile).filter(
-        models.DBFile.filename == file.filename,
-        models.DBFile.parent_id == parent_id
-    ).first()
-    
-    if existing_file:
-         db.delete(existing_file)
-         db.commit()
-         
-    new_file = models.DBFile(
-        filename=file.filename,
-        content_type=file.content_type,
-        size=len(request_object_content),
-        data=request_object_content,
-        parent_id=parent_id,
-        is_folder=False
-    )
-    db.add(new_file)
-    db.commit()
-    
-    return {"filename": file.filename}
+
+    content_type = file.content_type
+    size = len(request_object_content)
+    # Hashed here, off both the event loop and the writer thread
+    content_hash = await run_in_threadpool(hash_contents, request_object_content)
+
+    def upsert_file(db: Session):
+        course_id, parent_path = get_parent(db, claims, parent_id, access=can_write)
+        put_blob(db, request_object_content, content_hash)
+
+        # Insert, or replace the contents of the file already using this name, in one statement.
+        # The WHERE keeps folders and other people's files from being overwritten.
+        files = models.DBFile
+        stmt = dialect_insert(files).values(
+            filename=file.filename,
+            content_type=content_type,
+            size=size,
+            content_hash=content_hash,
+            parent_id=parent_id,
+            is_folder=False,
+            owner_id=claims.user_id,
+            course_id=course_id,
+            version=1
+        )
+        name_key, name_key_where = models.file_name_key()
+        stmt = stmt.on_conflict_do_update(
+            index_elements=name_key,
+            index_where=name_key_where,
+            set_={
+                "content_type": stmt.excluded.content_type,
+                "size": stmt.excluded.size,
+                "content_hash": stmt.excluded.content_hash,
+                "version": files.version + 1,
+                # ON CONFLICT updates skip Column.onupdate
+                "updated_at": models.utcnow(),
+            },
+            where=and_(files.is_folder == False, can_write(claims))
+        ).returning(
+            files.id, files.version, files.path, files.filename, files.size, files.content_type,
+            files.is_folder, files.parent_id, files.owner_id, files.course_id
+        )
+        row = db.execute(stmt).first()
+        if row is None:
+            raise HTTPException(status_code=409, detail=f"'{file.filename}' exists and cannot be replaced")
+
+        if row.path is None:
+            db.query(files).filter(files.id == row.id).update(
+                {files.path: child_path(parent_path, row.id)}, synchronize_session=False
+            )
+        record_version(db, row.id, row.version, content_hash, size, content_type, claims.user_id)
+        return row
+
+    row = await run_write(upsert_file)
+    listed = file_item(row)
+    await broadcaster.publish(row.parent_id, row.owner_id, row.course_id, {
+        "type": "added" if row.version == 1 else "updated", "item": listed
+    })
+    return {"filename": file.filename, "version": row.version, "item": msgspec.to_builtins(listed)}
 
 @app.delete("/files/delete/{item_id}")
-async def delete_item(item_id: int, db: Session = Depends(get_db)):
-    # Recursive delete function
-    def delete_recursive(id):
-        children = db.query(models.DBFile).filter(models.DBFile.parent_id == id).all()
-        for child in children:
-            delete_recursive(child.id)
-        
-        item = db.query(models.DBFile).filter(models.DBFile.id == id).first()
-        if item:
-            db.delete(item)
-
-    item = db.query(models.DBFile).filter(models.DBFile.id == item_id).first()
-    if item:
-        # If it's a folder, delete children content first
-        if item.is_folder:
-            delete_recursive(item.id)
-        else:
-            db.delete(item)
-            
-        db.commit()
-        return {"message": "Item deleted"}
-    raise HTTPException(status_code=404, detail="Item not found")
+async def delete_item(item_id: int, claims: TokenClaims = Depends(get_current_claims)):
+    def delete_tree(db: Session):
+        item = db.query(
+            models.DBFile.path, models.DBFile.parent_id, models.DBFile.owner_id, models.DBFile.course_id
+        ).filter(models.DBFile.id == item_id, can_write(claims)).first()
+        if not item:
+            return None
+        # Moves the item and everything below it to the trash; the purger removes them later
+        trash_subtree(db, item_id, item.path)
+        return item
+
+    item = await run_write(delete_tree)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    await broadcaster.publish(item.parent_id, item.owner_id, item.course_id, {"type": "removed", "id": item_id})
+    return {"message": "Item moved to trash"}
+
+@app.get("/files/trash")
+async def list_trash(db: Session = Depends(get_db), claims: TokenClaims = Depends(get_current_claims)):
+    # Deleted items the user can restore; contents of deleted folders come back with them
+    files = models.DBFile
+    items = db.query(
+        files.id, files.filename, files.size, files.is_folder, files.parent_id, files.trashed_at
+    ).filter(
+        files.trash_root_id == files.id,
+        files.trashed_at >= models.utcnow() - retention(),
+        can_write(claims, trashed=True)
+    ).order_by(files.trashed_at.desc()).all()
+    return [
+        {
+            "id": item.id,
+            "name": item.filename,
+            "is_folder": item.is_folder,
+            "size": item.size,
+            "parent_id": item.parent_id,
+            "trashed_at": item.trashed_at,
+            "purge_after": item.trashed_at + retention()
+        }
+        for item in items
+    ]
+
+@app.post("/files/trash/{item_id}/restore")
+async def restore_item(item_id: int, claims: TokenClaims = Depends(get_current_claims)):
+    def restore(db: Session):
+        item = db.query(models.DBFile).filter(
+            models.DBFile.id == item_id,
+            models.DBFile.trash_root_id == item_id,
+            models.DBFile.trashed_at >= models.utcnow() - retention(),
+            can_write(claims, trashed=True)
+        ).first()
+        if not item:
+            raise HTTPException(status_code=404, detail="Item not found in trash")
+        if item.parent_id is not None and not db.query(models.DBFile.id).filter(
+            models.DBFile.id == item.parent_id, models.DBFile.trashed_at.is_(None)
+        ).first():
+            raise HTTPException(status_code=409, detail="Restore the folder it was in first")
+        ensure_name_free(db, item.parent_id, item.filename)
+        restore_subtree(db, item_id, item.path)
+        return file_item(item), item.owner_id, item.course_id
+
+    listed, owner_id, course_id = await run_write(restore)
+    await broadcaster.publish(listed.parent_id, owner_id, course_id, {"type": "added", "item": listed})
+    return {"message": "Item restored"}
 
 @app.get("/files/download/{item_id}")
-async def download_file(item_id: int, db: Session = Depends(get_db)):
-    db_file = db.query(models.DBFile).filter(models.DBFile.id == item_id).first()
+async def download_file(
+    item_id: int,
+    version: Optional[int] = None,
+    db: Session = Depends(get_db),
+    claims: TokenClaims = Depends(get_current_claims)
+):
+    db_file = db.query(models.DBFile).filter(models.DBFile.id == item_id, can_read(claims)).first()
+    if db_file and not db_file.is_folder and version is not None and version != db_file.version:
+        old = db.query(models.FileVersion).filter(
+            models.FileVersion.file_id == item_id,
+            models.FileVersion.version == version
+        ).first()
+        if not old:
+            raise HTTPException(status_code=404, detail="Version not found")
+        return StreamingResponse(
+            io.BytesIO(read_blob(db, old)),
+            media_type=old.content_type,
+            headers={"Content-Disposition": f"attachment; filename={db_file.filename}"}
+        )
     if db_file and not db_file.is_folder:
         return StreamingResponse(
-            io.BytesIO(db_file.data), 
+            io.BytesIO(read_blob(db, db_file)), 
             media_type=db_file.content_type,
             headers={"Content-Disposition": f"attachment; filename={db_file.filename}"}
         )
     raise HTTPException(status_code=404, detail="File not found or is a folder")
 
+@app.post("/files/share/{item_id}")
+async def share_item(item_id: int, share: ShareRequest, claims: TokenClaims = Depends(get_current_claims)):
+    # Sets (or clears, with course_id null) the course of an item and everything below it
+    def set_course(db: Session):
+        item = db.query(models.DBFile.path).filter(models.DBFile.id == item_id, can_write(claims)).first()
+        if not item:
+            raise HTTPException(status_code=404, detail="Item not found")
+        if share.course_id is not None and not is_course_member(db, claims, share.course_id):
+            raise HTTPException(status_code=404, detail="Course not found")
+
+        db.query(models.DBFile).filter(subtree_filter(item.path)).update(
+            {models.DBFile.course_id: share.course_id}, synchronize_session=False
+        )
+
+    await run_write(set_course)
+    return {"message": "Sharing updated"}
+
+@app.get("/files/versions/{item_id}")
+async def list_versions(
+    item_id: int,
+    db: Session = Depends(get_db),
+    claims: TokenClaims = Depends(get_current_claims)
+):
+    if not db.query(models.DBFile.id).filter(models.DBFile.id == item_id, can_read(claims)).first():
+        raise HTTPException(status_code=404, detail="File not found")
+    versions = db.query(models.FileVersion).filter(
+        models.FileVersion.file_id == item_id
+    ).order_by(models.FileVersion.version.desc()).all()
+    return [
+        {
+            "version": v.version,
+            "size": v.size,
+            "type": v.content_type,
+            "uploaded_by": v.uploaded_by,
+            "created_at": v.created_at
+        }
+        for v in versions
+    ]
+
+@app.post("/files/versions/{item_id}/restore/{version}")
+async def restore_version(item_id: int, version: int, claims: TokenClaims = Depends(get_current_claims)):
+    # Restoring makes the old contents the newest version; the bytes are shared, not copied
+    def restore(db: Session):
+        item = db.query(models.DBFile).filter(
+            models.DBFile.id == item_id,
+            models.DBFile.is_folder == False,
+            can_write(claims)
+        ).first()
+        if not item:
+            raise HTTPException(status_code=404, detail="File not found")
+        old = db.query(models.FileVersion).filter(
+            models.FileVersion.file_id == item_id,
+            models.FileVersion.version == version
+        ).first()
+        if not old:
+            raise HTTPException(status_code=404, detail="Version not found")
+        item.version = (item.version or 1) + 1
+        item.content_hash = old.content_hash
+        item.size = old.size
+        item.content_type = old.content_type
+        record_version(db, item.id, item.version, old.content_hash, old.size, old.content_type, claims.user_id)
+        return item.version, file_item(item), item.owner_id, item.course_id
+
+    new_version, listed, owner_id, course_id = await run_write(restore)
+    await broadcaster.publish(listed.parent_id, owner_id, course_id, {"type": "updated", "item": listed})
+    return {"id": item_id, "version": new_version}
+
+# Reorganizing only rewrites metadata (parent_id, filename, path, course); file contents are never touched
+
+@app.post("/files/move/{item_id}")
+async def move_item(item_id: int, move: MoveRequest, claims: TokenClaims = Depends(get_current_claims)):
+    def move_subtree(db: Session):
+        item = db.query(models.DBFile).filter(models.DBFile.id == item_id, can_write(claims)).first()
+        if not item:
+            raise HTTPException(status_code=404, detail="Item not found")
+        course_id, parent_path = get_parent(db, claims, move.parent_id, access=can_write)
+        if parent_path and is_within(parent_path, item.path):
+            raise HTTPException(status_code=400, detail="Cannot move a folder into itself")
+        if move.parent_id == item.parent_id:
+            return None
+        ensure_name_free(db, move.parent_id, item.filename)
+
+        old_parent_id, old_course_id = item.parent_id, item.course_id
+        new_path = child_path(parent_path, item.id)
+        rebase_subtree(db, item.path, new_path)
+        # Like anything created there, the moved items now belong to the destination's course
+        db.query(models.DBFile).filter(subtree_filter(new_path)).update(
+            {models.DBFile.course_id: course_id}, synchronize_session=False
+        )
+        item.parent_id = move.parent_id
+        item.course_id = course_id
+        return old_parent_id, old_course_id, file_item(item), item.owner_id, course_id
+
+    moved = await run_write(move_subtree)
+    if moved:
+        old_parent_id, old_course_id, listed, owner_id, course_id = moved
+        await broadcaster.publish(old_parent_id, owner_id, old_course_id, {"type": "removed", "id": item_id})
+        await broadcaster.publish(move.parent_id, owner_id, course_id, {"type": "added", "item": listed})
+    return {"message": "Item moved"}
+
+@app.post("/files/rename/{item_id}")
+async def rename_item(item_id: int, rename: RenameRequest, claims: TokenClaims = Depends(get_current_claims)):
+    def set_name(db: Session):
+        item = db.query(models.DBFile).filter(models.DBFile.id == item_id, can_write(claims)).first()
+        if not item:
+            raise HTTPException(status_code=404, detail="Item not found")
+        if item.filename == rename.name:
+            return None
+        ensure_name_free(db, item.parent_id, rename.name)
+        item.filename = rename.name
+        return item.parent_id, item.owner_id, item.course_id
+
+    renamed = await run_write(set_name)
+    if renamed:
+        parent_id, owner_id, course_id = renamed
+        await broadcaster.publish(parent_id, owner_id, course_id, {"type": "renamed", "id": item_id, "name": rename.name})
+    return {"id": item_id, "name": rename.name}
+
+@app.post("/files/copy/{item_id}")
+async def copy_item(item_id: int, copy: CopyRequest, claims: TokenClaims = Depends(get_current_claims)):
+    def copy_subtree(db: Session):
+        source = db.query(models.DBFile.path).filter(models.DBFile.id == item_id, can_read(claims)).first()
+        if not source:
+            raise HTTPException(status_code=404, detail="Item not found")
+        course_id, parent_path = get_parent(db, claims, copy.parent_id, access=can_write)
+        if parent_path and is_within(parent_path, source.path):
+            raise HTTPException(status_code=400, detail="Cannot copy a folder into itself")
+
+        rows = db.query(
+            models.DBFile.id,
+            models.DBFile.filename,
+            models.DBFile.content_type,
+            models.DBFile.size,
+            models.DBFile.is_folder,
+            models.DBFile.parent_id,
+            models.DBFile.content_hash,
+            models.DBFile.path
+        ).filter(subtree_filter(source.path), can_read(claims)).all()
+
+        # Insert level by level so every parent has its new id before its children
+        levels = {}
+        for row in rows:
+            levels.setdefault(row.path.count("/"), []).append(row)
+
+        new_ids = {}
+        new_paths = {}
+        copied = None
+        for depth in sorted(levels):
+            created = []
+            for row in levels[depth]:
+                if row.id == item_id:
+                    name = copy.name or row.filename
+                    ensure_name_free(db, copy.parent_id, name)
+                    new_parent, new_parent_path = copy.parent_id, parent_path
+                elif row.parent_id in new_ids:
+                    name = row.filename
+                    new_parent, new_parent_path = new_ids[row.parent_id], new_paths[row.parent_id]
+                else:
+                    # Parent was not readable, so neither is this branch of the copy
+                    continue
+                new_row = models.DBFile(
+                    filename=name,
+                    content_type=row.content_type,
+                    size=row.size,
+                    is_folder=row.is_folder,
+                    content_hash=row.content_hash,
+                    parent_id=new_parent,
+                    owner_id=claims.user_id,
+                    course_id=course_id
+                )
+                db.add(new_row)
+                created.append((row.id, new_row, new_parent_path))
+            db.flush()
+            for old_id, new_row, new_parent_path in created:
+                new_row.path = child_path(new_parent_path, new_row.id)
+                if not new_row.is_folder:
+                    new_row.version = 1
+                    record_version(db, new_row.id, 1, new_row.content_hash, new_row.size, new_row.content_type, claims.user_id)
+                new_ids[old_id] = new_row.id
+                new_paths[old_id] = new_row.path
+                if old_id == item_id:
+                    copied = file_item(new_row)
+        return copied, course_id
+
+    copied, course_id = await run_write(copy_subtree)
+    await broadcaster.publish(copy.parent_id, claims.user_id, course_id, {"type": "added", "item": copied})
+    return {"id": copied.id, "message": "Item copied"}
+
+# Admin Endpoints
+
+@app.get("/admin/backup")
+def stream_backup(since: Optional[datetime] = None, claims: TokenClaims = Depends(require_role("admin"))):
+    # Streams everything changed since `since` while the app keeps serving; the last
+    # line carries the value to pass as `since` next time. Declared sync so the
+    # database reads run in the threadpool. Admin accounts are created with
+    # `python manage.py create-admin <email>`.
+    return StreamingResponse(iter_backup_ndjson(since), media_type="application/x-ndjson")
+
 if __name__ == "__main__":
     import uvicorn
     print("Starting backend...")
-    uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
+    # For production use gunicorn.conf.py (preloaded app, graceful reload).
+    # WEB_CONCURRENCY > 1 here is a quick way to use every core during development.
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    check_workers(workers)
+    if workers > 1:
+        uvicorn.run("main:app", host="127.0.0.1", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
@@ -0,0 +1,45 @@
+# Administrative commands for the SQLAlchemy backend (main.py).
+#
+#   python manage.py create-admin <email> [--name NAME]
+#
+# Registration only creates students and teachers, so admin accounts (required by
+# /admin/backup) are created here, or an existing account is promoted. The password
+# is taken from ADMIN_PASSWORD, or prompted for when creating a new account.
+import argparse
+import getpass
+import os
+
+from main import get_password_hash
+from database import SessionLocal
+import models
+
+
+def create_admin(email, name=None):
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.email == email).first()
+        password = os.getenv("ADMIN_PASSWORD")
+        if user is None:
+            if not password:
+                password = getpass.getpass(f"Password for {email}: ")
+            user = models.User(name=name or email, email=email, password_hash=get_password_hash(password))
+            db.add(user)
+        elif password:
+            user.password_hash = get_password_hash(password)
+        user.role = "admin"
+        db.commit()
+        print(f"{email} is now an admin")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Administrative commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+    admin = commands.add_parser("create-admin", help="create an admin account or promote an existing one")
+    admin.add_argument("email")
+    admin.add_argument("--name")
+    args = parser.parse_args()
+
+    if args.command == "create-admin":
+        create_admin(args.email, args.name)
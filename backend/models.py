@@ -1,6 +1,10 @@
-from sqlalchemy import Column, Integer, String, LargeBinary, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, LargeBinary, Boolean, DateTime, ForeignKey, Index, func, literal_column
+from datetime import datetime, timezone
 from database import Base
 
+def utcnow():
+    return datetime.now(timezone.utc)
+
 class User(Base):
     __tablename__ = "users"
 
@@ -9,6 +13,43 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     password_hash = Column(String)
     role = Column(String)
+    # Change tracking for incremental backups (backup.py)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow, index=True)
+
+class Course(Base):
+    __tablename__ = "courses"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, index=True)
+    owner_id = Column(Integer, ForeignKey('users.id'))
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow, index=True)
+
+class CourseMember(Base):
+    __tablename__ = "course_members"
+
+    # (user_id, course_id) order so "courses of this user" is an index range scan
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    course_id = Column(Integer, ForeignKey('courses.id'), primary_key=True, index=True)
+
+class FileBlob(Base):
+    __tablename__ = "blobs"
+
+    # File contents, stored once per SHA-256 and shared by every item (and copy) with the same bytes
+    hash = Column(String, primary_key=True)
+    size = Column(Integer)
+    # NULL while the contents sit compressed in the archive tier (see tiering.py)
+    data = Column(LargeBinary)
+
+    # "hot" (in data) or "cold" (archived); NULL rows predate tiering and are hot
+    tier = Column(String, default="hot")
+    # Read statistics, flushed in batches by tiering.flush_access_stats
+    access_count = Column(Integer, default=0)
+    last_accessed_at = Column(DateTime, default=utcnow, index=True)
+
+# tree.subtree_filter relies on paths comparing byte by byte ("/" before "0"). That is
+# SQLite's default; on Postgres the database's linguistic collation may order
+# punctuation differently, so the column (and its index) use "C"
+PATH_TYPE = String().with_variant(String(collation="C"), "postgresql")
 
 class DBFile(Base):
     __tablename__ = "files"
@@ -17,9 +58,77 @@ class DBFile(Base):
     filename = Column(String, index=True)
     content_type = Column(String)
     size = Column(Integer)
+    # Contents of items created before blobs existed; see blobstore.migrate_legacy_content
     data = Column(LargeBinary)
     
     # New columns for folder structure
     is_folder = Column(Boolean, default=False)
     parent_id = Column(Integer, ForeignKey('files.id'), nullable=True)
 
+    # Access control: the uploader owns an item, members of its course can read it.
+    # Items with neither (created before ownership existed) are public.
+    owner_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
+    course_id = Column(Integer, ForeignKey('courses.id'), nullable=True, index=True)
+
+    content_hash = Column(String, ForeignKey('blobs.hash'), nullable=True, index=True)
+
+    # Hierarchy index: ids from the root down to this item, e.g. "/4/17/23/".
+    # A whole subtree is one index range scan (see tree.subtree_filter).
+    path = Column(PATH_TYPE, nullable=True, index=True)
+
+    # Number of the current entry in file_versions
+    version = Column(Integer, default=1)
+
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow, index=True)
+
+    # Soft delete (see trash.py): when the item or a folder above it was deleted, and
+    # the id of the item that was deleted, which is what gets restored or purged
+    trashed_at = Column(DateTime, nullable=True)
+    trash_root_id = Column(Integer, nullable=True, index=True)
+
+    __table_args__ = (
+        # Folder listings filter on parent first, then on ownership
+        Index("ix_files_parent_owner", "parent_id", "owner_id"),
+        # One live item per name and folder; trashed items keep their names without blocking them.
+        # NULL parents (root) would never conflict, hence the coalesce; upserts must use the
+        # same expression and condition as their conflict target (see file_name_key)
+        Index(
+            "uq_files_live_parent_filename",
+            func.coalesce(parent_id, literal_column("0")), filename,
+            unique=True,
+            sqlite_where=trashed_at.is_(None),
+            postgresql_where=trashed_at.is_(None),
+        ),
+    )
+
+def file_name_key():
+    # ON CONFLICT target matching uq_files_live_parent_filename: (index_elements, index_where)
+    return [func.coalesce(DBFile.parent_id, literal_column("0")), DBFile.filename], DBFile.trashed_at.is_(None)
+
+class FileVersion(Base):
+    __tablename__ = "file_versions"
+
+    # Metadata only; the bytes stay in blobs and are shared with the file and other versions
+    id = Column(Integer, primary_key=True, index=True)
+    file_id = Column(Integer, ForeignKey('files.id'), nullable=False)
+    version = Column(Integer, nullable=False)
+    content_hash = Column(String, ForeignKey('blobs.hash'), index=True)
+    size = Column(Integer)
+    content_type = Column(String)
+    uploaded_by = Column(Integer, ForeignKey('users.id'), nullable=True)
+    created_at = Column(DateTime, default=utcnow, index=True)
+
+    __table_args__ = (
+        Index("uq_file_versions_file_version", "file_id", "version", unique=True),
+    )
+
+class Tombstone(Base):
+    __tablename__ = "tombstones"
+
+    # Rows deleted from backed-up tables, so incremental backups can replay deletions
+    # (see backup.record_deletions). Pruned after TOMBSTONE_RETENTION_DAYS.
+    id = Column(Integer, primary_key=True)
+    table_name = Column(String)
+    # Primary key of the deleted row as JSON: a value, or a list for composite keys
+    row_key = Column(String)
+    deleted_at = Column(DateTime, default=utcnow, index=True)
@@ -0,0 +1,46 @@
+from sqlalchemy import and_, or_, select
+
+import models
+from auth import TokenClaims
+
+# File access rules, expressed as SQL predicates so they are applied by the
+# database (through the owner/course indexes) rather than row by row in Python.
+#
+#   read:  owner, members of the item's course, or anyone for legacy items without owner/course
+#   write: owner, teachers who are members of the item's course, or teachers for legacy items
+#
+# Items in the trash (see trash.py) are excluded unless `trashed=True`, which matches
+# only trashed items instead.
+
+def member_course_ids(user_id: int):
+    return select(models.CourseMember.course_id).where(models.CourseMember.user_id == user_id)
+
+def _is_legacy():
+    return and_(models.DBFile.owner_id.is_(None), models.DBFile.course_id.is_(None))
+
+def _in_trash(trashed: bool):
+    if trashed:
+        return models.DBFile.trashed_at.isnot(None)
+    return models.DBFile.trashed_at.is_(None)
+
+def can_read(claims: TokenClaims, trashed: bool = False):
+    return and_(_in_trash(trashed), or_(
+        models.DBFile.owner_id == claims.user_id,
+        models.DBFile.course_id.in_(member_course_ids(claims.user_id)),
+        _is_legacy(),
+    ))
+
+def can_write(claims: TokenClaims, trashed: bool = False):
+    if claims.role != "teacher":
+        return and_(_in_trash(trashed), models.DBFile.owner_id == claims.user_id)
+    return and_(_in_trash(trashed), or_(
+        models.DBFile.owner_id == claims.user_id,
+        models.DBFile.course_id.in_(member_course_ids(claims.user_id)),
+        _is_legacy(),
+    ))
+
+def is_course_member(db, claims: TokenClaims, course_id: int) -> bool:
+    return db.query(models.CourseMember).filter(
+        models.CourseMember.user_id == claims.user_id,
+        models.CourseMember.course_id == course_id
+    ).first() is not None
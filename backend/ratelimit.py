@@ -0,0 +1,47 @@
+from fastapi import HTTPException, Request, status
+import math
+import os
+
+from state import get_state
+
+# Login attempts are limited before any password hashing happens, so a
+# credential-stuffing burst costs us a dictionary (or Redis) lookup per attempt.
+# Rates are attempts per minute; bursts are the bucket capacity.
+LOGIN_RATE_PER_IP = float(os.getenv("LOGIN_RATE_PER_IP", 20))
+LOGIN_BURST_PER_IP = int(os.getenv("LOGIN_BURST_PER_IP", 10))
+LOGIN_RATE_PER_ACCOUNT = float(os.getenv("LOGIN_RATE_PER_ACCOUNT", 5))
+LOGIN_BURST_PER_ACCOUNT = int(os.getenv("LOGIN_BURST_PER_ACCOUNT", 5))
+
+# Number of reverse proxies in front of the app that append to X-Forwarded-For.
+# Each proxy appends the address it received the request from, so the client is the
+# entry that many places from the right; anything further left came from the client
+# and can be forged. 0 (the default) ignores the header. TRUST_FORWARDED_FOR=true is
+# kept as shorthand for one proxy.
+TRUSTED_PROXY_HOPS = int(os.getenv(
+    "TRUSTED_PROXY_HOPS",
+    1 if os.getenv("TRUST_FORWARDED_FOR", "").lower() in ("1", "true", "yes") else 0
+))
+
+def client_ip(request: Request) -> str:
+    if TRUSTED_PROXY_HOPS > 0:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            entries = [e.strip() for e in forwarded.split(",") if e.strip()]
+            if entries:
+                return entries[-min(TRUSTED_PROXY_HOPS, len(entries))]
+    return request.client.host if request.client else "unknown"
+
+async def check_login_rate(request: Request, email: str):
+    state = get_state()
+    buckets = [
+        (f"rl:login:ip:{client_ip(request)}", LOGIN_RATE_PER_IP, LOGIN_BURST_PER_IP),
+        (f"rl:login:account:{email.strip().lower()}", LOGIN_RATE_PER_ACCOUNT, LOGIN_BURST_PER_ACCOUNT),
+    ]
+    for key, per_minute, burst in buckets:
+        allowed, retry_after = await state.take_token(key, per_minute / 60, burst)
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login attempts. Please try again later.",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
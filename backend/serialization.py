@@ -0,0 +1,53 @@
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from typing import Optional
+
+import msgspec
+
+# Fast response encoding. Endpoints that return large lists build msgspec Structs
+# (no per-row dicts) and hand them to encode_response, which skips FastAPI's
+# jsonable_encoder pass and can answer in MessagePack when the client asks for it.
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+_json_encoder = msgspec.json.Encoder()
+_msgpack_encoder = msgspec.msgpack.Encoder()
+
+
+class FileItem(msgspec.Struct):
+    id: int
+    name: str
+    size: str
+    type: Optional[str]
+    is_folder: bool
+    parent_id: Optional[int]
+
+
+def format_size(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    elif size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / (1024 * 1024):.1f} MB"
+
+def file_item(row) -> FileItem:
+    # row: anything with id, filename, size, content_type, is_folder and parent_id
+    if row.is_folder:
+        return FileItem(row.id, row.filename, "-", "folder", True, row.parent_id)
+    return FileItem(row.id, row.filename, format_size(row.size or 0), row.content_type, False, row.parent_id)
+
+
+def encode_response(request: Request, content, status_code: int = 200) -> Response:
+    accept = request.headers.get("accept", "")
+    headers = {"Vary": "Accept"}
+    if any(t in accept for t in MSGPACK_TYPES):
+        return Response(_msgpack_encoder.encode(content), status_code=status_code,
+                        media_type="application/msgpack", headers=headers)
+    return Response(_json_encoder.encode(content), status_code=status_code,
+                    media_type="application/json", headers=headers)
+
+
+class MsgspecJSONResponse(JSONResponse):
+    # Drop-in default_response_class: same output as JSONResponse, faster encoder
+    def render(self, content) -> bytes:
+        return _json_encoder.encode(content)
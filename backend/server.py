@@ -1,11 +1,13 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+import asyncio
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from starlette.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from motor.motor_asyncio import AsyncIOMotorClient
 from typing import List, Optional
 import uuid
@@ -14,7 +16,11 @@ from passlib.context import CryptContext
 import jwt
 
 ROOT_DIR = Path(__file__).parent
-from files import router as files_router
+from files import UploadLimitMiddleware, router as files_router
+from storage import GridFSStorage, LocalStorage
+from ratelimit import check_login_rate
+from stats import GLOBAL, Stats, user_key
+from serialization import MsgspecJSONResponse, encode_response
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
@@ -30,7 +36,7 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=MsgspecJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -120,6 +126,7 @@ async def register(user_data: UserRegister):
     user_dict['password'] = hash_password(user_data.password)
     
     await db.users.insert_one(user_dict)
+    await app.state.stats.record_register(user_dict)
     
     # Create token
     access_token = create_access_token(data={"sub": user.id, "role": user.role})
@@ -131,14 +138,17 @@ async def register(user_data: UserRegister):
     )
 
 @api_router.post("/auth/login", response_model=TokenResponse)
-async def login(credentials: UserLogin):
+async def login(credentials: UserLogin, request: Request):
+    # Throttle before doing any hashing work
+    await check_login_rate(request, credentials.email)
+
     # Find user
     user_doc = await db.users.find_one({"email": credentials.email}, {"_id": 0})
     if not user_doc:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     # Verify password
-    if not verify_password(credentials.password, user_doc['password']):
+    if not await run_in_threadpool(verify_password, credentials.password, user_doc['password']):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     # Convert datetime
@@ -146,6 +156,7 @@ async def login(credentials: UserLogin):
         user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
     
     user = User(**{k: v for k, v in user_doc.items() if k != 'password'})
+    await app.state.stats.record_login(user_doc)
     
     # Create token
     access_token = create_access_token(data={"sub": user.id, "role": user.role})
@@ -157,24 +168,27 @@ async def login(credentials: UserLogin):
     )
 
 @api_router.get("/auth/me", response_model=User)
-async def get_me(current_user: dict = Depends(get_current_user)):
-    if isinstance(current_user['created_at'], str):
-        current_user['created_at'] = datetime.fromisoformat(current_user['created_at'])
-    return User(**{k: v for k, v in current_user.items() if k != 'password'})
+async def get_me(request: Request, current_user: dict = Depends(get_current_user)):
+    # The document was validated when it was stored; encode it directly instead of
+    # rebuilding a User model on every call
+    return encode_response(request, {k: current_user.get(k) for k in User.model_fields})
 
 # Dashboard Routes
+# Both read precomputed counters (see stats.py): one lookup regardless of data size
 @api_router.get("/dashboard/student")
 async def get_student_dashboard(current_user: dict = Depends(get_current_user)):
     if current_user['role'] != 'student':
         raise HTTPException(status_code=403, detail="Access denied. Students only.")
     
+    totals, mine = await app.state.stats.read(GLOBAL, user_key(current_user['id']))
     return {
         "message": "Welcome to Student Dashboard",
         "user": current_user['name'],
         "stats": {
-            "courses_enrolled": 5,
-            "assignments_pending": 3,
-            "overall_progress": 75
+            "files_available": totals.get("files", 0),
+            "logins": mine.get("logins", 0),
+            "last_login": mine.get("last_login"),
+            "recent_uploads": [e for e in totals.get("recent", []) if e["type"] == "upload"]
         }
     }
 
@@ -183,19 +197,40 @@ async def get_teacher_dashboard(current_user: dict = Depends(get_current_user)):
     if current_user['role'] != 'teacher':
         raise HTTPException(status_code=403, detail="Access denied. Teachers only.")
     
+    totals, = await app.state.stats.read(GLOBAL)
+    users = totals.get("users", {})
     return {
         "message": "Welcome to Teacher Dashboard",
         "user": current_user['name'],
         "stats": {
-            "courses_teaching": 3,
-            "total_students": 45,
-            "pending_reviews": 12
+            "total_students": users.get("student", 0),
+            "total_teachers": users.get("teacher", 0),
+            "files_shared": totals.get("files", 0),
+            "storage_used_bytes": totals.get("storage_bytes", 0),
+            "uploads": totals.get("uploads", 0),
+            "logins": totals.get("logins", 0),
+            "recent_activity": totals.get("recent", [])
         }
     }
 
+# File storage: GridFS lets several app instances share files without a shared disk
+if os.environ.get('FILES_STORAGE', 'local') == 'gridfs':
+    app.state.files_storage = GridFSStorage(db)
+else:
+    app.state.files_storage = LocalStorage()
+
+app.state.stats = Stats(db)
+
+@app.on_event("startup")
+async def ensure_storage_indexes():
+    await app.state.files_storage.ensure_indexes()
+    # First run also seeds the counters for data that predates them
+    asyncio.create_task(app.state.stats.reconcile_periodically(app.state.files_storage))
+
 # Include the router in the main app
 app.include_router(api_router)
 app.include_router(files_router, prefix="/api/files", tags=["files"])
+app.add_middleware(UploadLimitMiddleware, path="/api/files/upload")
 
 app.add_middleware(
     CORSMiddleware,
@@ -0,0 +1,164 @@
+import json
+import os
+import time
+import uuid
+
+# Shared state for values that must agree across worker processes
+# (caches, rate limits, upload sessions, job leases).
+# Without STATE_BACKEND_URL everything lives in the current process, which is only
+# correct for a single worker. Point it at Redis when running several workers.
+STATE_BACKEND_URL = os.getenv("STATE_BACKEND_URL", "")
+
+def is_shared():
+    # True when state (and file events, see events.py) is shared between processes
+    return STATE_BACKEND_URL.startswith(("redis://", "rediss://", "unix://"))
+
+def check_workers(workers):
+    # Several workers on per-process state multiply the login limits, run every
+    # leased job in each worker at once and keep file events within one worker
+    if workers > 1 and not is_shared():
+        raise SystemExit(
+            f"{workers} workers need shared state: set STATE_BACKEND_URL=redis://... "
+            "or run a single worker (WEB_CONCURRENCY=1)"
+        )
+
+# Identifies this process when taking leases
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+# Token bucket shared by every RedisState: refills at `rate` tokens per second up to `capacity`
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local retry_after = 0
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+# MemoryState drops expired keys once it holds this many entries
+MEMORY_STATE_SWEEP_AT = 10000
+
+
+class MemoryState:
+    def __init__(self):
+        self._data = {}
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    async def get(self, key):
+        entry = self._live(key)
+        return entry[0] if entry else None
+
+    async def set(self, key, value, ttl=None):
+        self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    async def set_if_absent(self, key, value, ttl=None):
+        if self._live(key):
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def incr(self, key, amount=1, ttl=None):
+        entry = self._live(key)
+        if entry:
+            value = entry[0] + amount
+            self._data[key] = (value, entry[1])
+        else:
+            value = amount
+            await self.set(key, value, ttl)
+        return value
+
+    async def delete(self, key):
+        self._data.pop(key, None)
+
+    async def take_token(self, key, rate, capacity):
+        # Returns (allowed, seconds until the next token is available)
+        if len(self._data) >= MEMORY_STATE_SWEEP_AT:
+            self._sweep()
+        now = time.monotonic()
+        entry = self._live(key)
+        tokens, ts = entry[0] if entry else (capacity, now)
+        tokens = min(capacity, tokens + (now - ts) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        # A bucket that has refilled completely is the same as no bucket at all
+        self._data[key] = ((tokens, now), now + capacity / rate)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+    def _sweep(self):
+        now = time.monotonic()
+        for key in [k for k, (_, expires_at) in self._data.items() if expires_at is not None and expires_at <= now]:
+            del self._data[key]
+
+
+class RedisState:
+    def __init__(self, url):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self._token_bucket = self.redis.register_script(_TOKEN_BUCKET_LUA)
+
+    async def get(self, key):
+        raw = await self.redis.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key, value, ttl=None):
+        await self.redis.set(key, json.dumps(value), ex=ttl)
+
+    async def set_if_absent(self, key, value, ttl=None):
+        return bool(await self.redis.set(key, json.dumps(value), ex=ttl, nx=True))
+
+    async def incr(self, key, amount=1, ttl=None):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if ttl:
+                # Only creates the key (with its expiry) when it does not exist yet
+                pipe.set(key, 0, ex=ttl, nx=True)
+            pipe.incrby(key, amount)
+            *_, value = await pipe.execute()
+        return value
+
+    async def delete(self, key):
+        await self.redis.delete(key)
+
+    async def take_token(self, key, rate, capacity):
+        allowed, retry_after = await self._token_bucket(keys=[key], args=[rate, capacity, time.time()])
+        return bool(allowed), float(retry_after)
+
+
+_state = None
+
+def get_state():
+    global _state
+    if _state is None:
+        if is_shared():
+            _state = RedisState(STATE_BACKEND_URL)
+        else:
+            _state = MemoryState()
+    return _state
+
+async def acquire_lease(name, ttl):
+    # True for exactly one worker per ttl window; used for periodic jobs that
+    # should not run once per process
+    return await get_state().set_if_absent(f"lease:{name}", WORKER_ID, ttl=ttl)
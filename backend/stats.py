@@ -0,0 +1,98 @@
+from fastapi import Request
+from datetime import datetime, timezone
+import asyncio
+import logging
+import os
+
+from state import acquire_lease
+
+# Dashboard statistics for the MongoDB backend (server.py).
+# Counters live in a small `stats` collection and are bumped with $inc as things
+# happen (uploads, deletes, logins, registrations), so a dashboard is a single
+# lookup by _id no matter how many users or files exist. A periodic job recounts
+# the values that can be derived from the data and corrects any drift.
+#
+# Documents: "global" (everyone) and "user:<id>" (one user). Each may carry a
+# capped "recent" list of activity events, newest last.
+
+logger = logging.getLogger(__name__)
+
+RECENT_ACTIVITY_SIZE = int(os.getenv("STATS_RECENT_ACTIVITY_SIZE", 20))
+STATS_RECONCILE_INTERVAL = int(os.getenv("STATS_RECONCILE_INTERVAL", 60 * 60))
+
+GLOBAL = "global"
+
+def user_key(user_id):
+    return f"user:{user_id}"
+
+
+class Stats:
+    def __init__(self, db):
+        self.collection = db.stats
+        self.users = db.users
+
+    async def _bump(self, key, inc=None, event=None, values=None):
+        update = {}
+        if inc:
+            update["$inc"] = inc
+        if values:
+            update["$set"] = values
+        if event:
+            event["at"] = datetime.now(timezone.utc).isoformat()
+            update["$push"] = {"recent": {"$each": [event], "$slice": -RECENT_ACTIVITY_SIZE}}
+        try:
+            await self.collection.update_one({"_id": key}, update, upsert=True)
+        except Exception as e:
+            # Counters are best effort; the reconcile job repairs missed updates
+            logger.warning(f"Stats update for {key} failed: {str(e)}")
+
+    async def record_upload(self, filename, size):
+        await self._bump(GLOBAL, {"files": 1, "storage_bytes": size, "uploads": 1},
+                         {"type": "upload", "name": filename})
+
+    async def record_delete(self, filename, size):
+        await self._bump(GLOBAL, {"files": -1, "storage_bytes": -size},
+                         {"type": "delete", "name": filename})
+
+    async def record_register(self, user):
+        await self._bump(GLOBAL, {f"users.{user['role']}": 1},
+                         {"type": "register", "name": user["name"]})
+
+    async def record_login(self, user):
+        now = datetime.now(timezone.utc).isoformat()
+        await self._bump(GLOBAL, {"logins": 1})
+        await self._bump(user_key(user["id"]), {"logins": 1}, {"type": "login"}, {"last_login": now})
+
+    async def read(self, *keys):
+        # One indexed lookup for all requested documents
+        docs = {doc["_id"]: doc async for doc in self.collection.find({"_id": {"$in": list(keys)}})}
+        return [docs.get(key, {}) for key in keys]
+
+    async def reconcile(self, storage):
+        # Recount what can be derived from the data. Event counts (logins, uploads)
+        # and activity history have no source of truth and are left as they are.
+        files = await storage.list()
+        users = {role: 0 for role in ("student", "teacher")}
+        async for row in self.users.aggregate([{"$group": {"_id": "$role", "count": {"$sum": 1}}}]):
+            users[row["_id"]] = row["count"]
+        await self.collection.update_one({"_id": GLOBAL}, {"$set": {
+            "files": len(files),
+            "storage_bytes": sum(f["size"] for f in files),
+            "users": users,
+            "reconciled_at": datetime.now(timezone.utc).isoformat(),
+        }}, upsert=True)
+
+    async def reconcile_periodically(self, storage):
+        while True:
+            # With several workers only the lease holder recounts
+            if await acquire_lease("stats-reconcile", max(STATS_RECONCILE_INTERVAL - 1, 1)):
+                try:
+                    await self.reconcile(storage)
+                except Exception as e:
+                    logger.warning(f"Stats reconcile failed: {str(e)}")
+            await asyncio.sleep(STATS_RECONCILE_INTERVAL)
+
+
+def get_stats(request: Request):
+    # Set by server.py; apps without it (main.py) skip stats
+    return getattr(request.app.state, "stats", None)
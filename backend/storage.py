@@ -0,0 +1,242 @@
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.responses import FileResponse, StreamingResponse
+import os
+import tempfile
+import time
+
+import anyio
+import anyio.to_thread
+
+# Storage backends for the files router (files.py).
+# LocalStorage keeps files in a directory on this machine. GridFSStorage keeps them
+# in MongoDB, so any number of app instances can serve the same files without a
+# shared disk. server.py picks one with FILES_STORAGE=local|gridfs.
+
+# Size of the pieces files are read and written in
+CHUNK_SIZE = 1024 * 1024
+
+
+def parse_range(range_header, length):
+    # Returns (start, end) inclusive for a single "bytes=" range, or None for the whole file
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].split(",")[0].strip()
+    start, _, end = spec.partition("-")
+    try:
+        if start:
+            start = int(start)
+            end = min(int(end), length - 1) if end else length - 1
+        else:
+            # "bytes=-500" is the last 500 bytes
+            start = max(length - int(end), 0)
+            end = length - 1
+    except ValueError:
+        return None
+    if start > end or start >= length:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable",
+                            headers={"Content-Range": f"bytes */{length}"})
+    return start, end
+
+
+# Disk work (open, write, fsync, stat, unlink) runs on worker threads so a large
+# upload never stalls the event loop. The limiter bounds how many threads one
+# worker process can tie up with file I/O.
+FILES_IO_THREADS = int(os.getenv("FILES_IO_THREADS", 8))
+_io_limiter = None
+
+async def run_io(fn, *args):
+    global _io_limiter
+    if _io_limiter is None:
+        _io_limiter = anyio.CapacityLimiter(FILES_IO_THREADS)
+    return await anyio.to_thread.run_sync(fn, *args, limiter=_io_limiter)
+
+
+# Uploads are written under a temporary name first; leftovers older than this are
+# removed on startup (younger ones may belong to another worker's upload in progress)
+TEMP_PREFIX = ".upload-"
+STALE_TEMP_SECONDS = 60 * 60
+
+class LocalStorage:
+    def __init__(self, directory="./uploads"):
+        self.directory = directory
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def _path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def _remove_stale_temp_files(self):
+        cutoff = time.time() - STALE_TEMP_SECONDS
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(TEMP_PREFIX) and entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    async def ensure_indexes(self):
+        await run_io(self._remove_stale_temp_files)
+
+    async def exists(self, filename):
+        return await run_io(os.path.exists, self._path(filename))
+
+    def _publish(self, temp_path, filename):
+        # Flush the contents, then give them their final name. link() fails instead
+        # of overwriting, so a concurrent upload of the same name cannot be clobbered
+        # and readers never see a partially written file.
+        try:
+            os.link(temp_path, self._path(filename))
+        except FileExistsError:
+            raise HTTPException(status_code=400, detail="File with this name already exists.")
+        finally:
+            os.remove(temp_path)
+        # Make the new directory entry durable too
+        dir_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    async def save(self, filename, file: UploadFile):
+        # Returns the number of bytes stored
+        size = 0
+        fd, temp_path = await run_io(tempfile.mkstemp, "", TEMP_PREFIX, self.directory)
+        try:
+            buffer = os.fdopen(fd, "wb")
+            try:
+                while True:
+                    chunk = await file.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    await run_io(buffer.write, chunk)
+                    size += len(chunk)
+                await run_io(buffer.flush)
+                await run_io(os.fsync, buffer.fileno())
+            finally:
+                await run_io(buffer.close)
+        except BaseException:
+            await run_io(os.remove, temp_path)
+            raise
+        await run_io(self._publish, temp_path, filename)
+        return size
+
+    def _list(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith(TEMP_PREFIX):
+                files.append({"name": entry.name, "size": entry.stat().st_size})
+        return files
+
+    async def list(self):
+        return await run_io(self._list)
+
+    async def download(self, filename, request: Request):
+        file_path = self._path(filename)
+        if not await run_io(os.path.isfile, file_path):
+            raise HTTPException(status_code=404, detail="File not found")
+        # FileResponse handles Range requests itself and reads the file off the event loop
+        return FileResponse(path=file_path, media_type='application/octet-stream', filename=filename)
+
+    def _delete(self, filename):
+        try:
+            size = os.path.getsize(self._path(filename))
+            os.remove(self._path(filename))
+            return size
+        except FileNotFoundError:
+            return None
+
+    async def delete(self, filename):
+        # Returns the size of the removed file, or None if there was none
+        return await run_io(self._delete, filename)
+
+
+class GridFSStorage:
+    def __init__(self, db, bucket_name="uploads"):
+        from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name=bucket_name, chunk_size_bytes=255 * 1024)
+        self.files = db[f"{bucket_name}.files"]
+
+    async def ensure_indexes(self):
+        # Unique names make "already exists" hold across every app instance;
+        # GridFS writes the files document last, so a losing upload fails at close()
+        await self.files.create_index("filename", unique=True)
+        await self.files.create_index("metadata.contentType")
+
+    async def exists(self, filename):
+        return await self.files.find_one({"filename": filename}, {"_id": 1}) is not None
+
+    async def save(self, filename, file: UploadFile):
+        from pymongo.errors import DuplicateKeyError
+
+        grid_in = self.bucket.open_upload_stream(filename, metadata={"contentType": file.content_type})
+        try:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                await grid_in.write(chunk)
+            await grid_in.close()
+            return grid_in.length
+        except DuplicateKeyError:
+            await grid_in.abort()
+            raise HTTPException(status_code=400, detail="File with this name already exists.")
+        except BaseException:
+            await grid_in.abort()
+            raise
+
+    async def list(self):
+        cursor = self.files.find({}, {"filename": 1, "length": 1})
+        return [{"name": doc["filename"], "size": doc["length"]} async for doc in cursor]
+
+    async def download(self, filename, request: Request):
+        from gridfs.errors import NoFile
+
+        try:
+            grid_out = await self.bucket.open_download_stream_by_name(filename)
+        except NoFile:
+            raise HTTPException(status_code=404, detail="File not found")
+
+        length = grid_out.length
+        byte_range = parse_range(request.headers.get("range"), length)
+        start, end = byte_range or (0, length - 1)
+        if start:
+            grid_out.seek(start)
+
+        async def stream():
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await grid_out.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+        headers = {
+            "Accept-Ranges": "bytes",
+            "Content-Length": str(max(end - start + 1, 0)),
+            "Content-Disposition": f'attachment; filename="{filename}"',
+        }
+        if byte_range:
+            headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+        return StreamingResponse(
+            stream(),
+            status_code=206 if byte_range else 200,
+            media_type='application/octet-stream',
+            headers=headers
+        )
+
+    async def delete(self, filename):
+        size = None
+        async for doc in self.files.find({"filename": filename}, {"_id": 1, "length": 1}):
+            await self.bucket.delete(doc["_id"])
+            size = (size or 0) + doc["length"]
+        return size
+
+
+def get_storage(request: Request):
+    # Set by the app (server.py); local disk otherwise
+    storage = getattr(request.app.state, "files_storage", None)
+    if storage is None:
+        storage = request.app.state.files_storage = LocalStorage()
+    return storage
@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+# The app reads its settings at import time, so everything it writes (database,
+# uploads, blob archive) is pointed at a scratch directory before main is imported.
+# Never let a DATABASE_URL from the environment send tests at a real database.
+WORKDIR = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORKDIR, 'test.db')}"
+os.environ["BLOB_ARCHIVE_DIR"] = os.path.join(WORKDIR, "blob_archive")
+os.environ.pop("STATE_BACKEND_URL", None)
+os.chdir(WORKDIR)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+# Restores must work with foreign keys enforced, as they are on Postgres
+database.SQLITE_PRAGMAS["foreign_keys"] = "ON"
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.fixture
+def register(client):
+    # Returns auth headers for a new user; every test gets fresh accounts
+    def register(role="teacher", email=None):
+        email = email or f"{uuid.uuid4().hex[:12]}@example.com"
+        response = client.post("/auth/register", json={
+            "name": email, "email": email, "password": "password", "role": role
+        })
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return register
+
+
+@pytest.fixture
+def session():
+    db = database.SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from database import SessionLocal
+import models
+import trash
+
+# Shortcuts for the requests and background jobs most tests need
+
+def upload(client, headers, name, body, parent_id=None):
+    data = {"parent_id": str(parent_id)} if parent_id is not None else {}
+    return client.post("/files/upload", files={"file": (name, body, "text/plain")}, data=data, headers=headers)
+
+def file_id(client, headers, name, parent_id=None):
+    params = {"parent_id": parent_id} if parent_id is not None else {}
+    return next(i["id"] for i in client.get("/files/list", params=params, headers=headers).json() if i["name"] == name)
+
+def expire(item_id):
+    # As if it had been trashed longer ago than the retention period
+    db = SessionLocal()
+    try:
+        db.query(models.DBFile).filter(models.DBFile.trash_root_id == item_id).update(
+            {models.DBFile.trashed_at: models.utcnow() - trash.retention() - timedelta(minutes=1)},
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def purge_expired():
+    # One pass of purge_expired_trash, without its schedule and lease
+    for root in trash._expired_roots():
+        while True:
+            ids = trash._batch_for(root.path)
+            if not ids:
+                break
+            db = SessionLocal()
+            try:
+                trash._purge_batch(db, ids)
+                db.commit()
+            finally:
+                db.close()
@@ -0,0 +1,74 @@
+from datetime import timedelta
+import time
+import uuid
+
+import auth
+import models
+from database import SessionLocal
+
+
+def register_tokens(client, role="student"):
+    email = f"{uuid.uuid4().hex[:12]}@example.com"
+    response = client.post("/auth/register", json={"name": email, "email": email, "password": "password", "role": role})
+    return response.json()
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_expired_access_tokens_are_rejected(client):
+    tokens = register_tokens(client)
+    user_id = auth.decode_token(tokens["access_token"], "access").user_id
+    expired = auth._create_token(user_id, "student", "access", timedelta(seconds=-1))
+
+    response = client.get("/files/list", headers=bearer(expired))
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token has expired"
+
+
+def test_cached_tokens_stop_working_when_they_expire(client):
+    tokens = register_tokens(client)
+    assert client.get("/files/list", headers=bearer(tokens["access_token"])).status_code == 200
+    assert tokens["access_token"] in auth._verified_tokens
+
+    # A token that verified while it was still valid
+    claims = auth.decode_token(tokens["access_token"], "access")
+    expired = auth._create_token(claims.user_id, claims.role, "access", timedelta(seconds=-1))
+    auth._verified_tokens[expired] = claims._replace(expires_at=int(time.time()) - 1)
+    assert client.get("/files/list", headers=bearer(expired)).status_code == 401
+    assert expired not in auth._verified_tokens
+
+
+def test_token_types_are_not_interchangeable(client):
+    tokens = register_tokens(client)
+    assert client.get("/files/list", headers=bearer(tokens["refresh_token"])).status_code == 401
+    assert client.post("/auth/refresh", json={"refresh_token": tokens["access_token"]}).status_code == 401
+
+
+def test_refresh_issues_new_tokens_with_the_current_role(client):
+    tokens = register_tokens(client, "student")
+    user_id = auth.decode_token(tokens["access_token"], "access").user_id
+    db = SessionLocal()
+    try:
+        db.query(models.User).filter(models.User.id == user_id).update({models.User.role: "teacher"})
+        db.commit()
+    finally:
+        db.close()
+
+    refreshed = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).json()
+    assert refreshed["role"] == "teacher"
+    assert client.post("/courses/create", json={"name": "new"}, headers=bearer(refreshed["access_token"])).status_code == 200
+    # The old access token keeps its role until it expires
+    assert client.post("/courses/create", json={"name": "old"}, headers=bearer(tokens["access_token"])).status_code == 403
+
+
+def test_refresh_fails_for_removed_accounts(client):
+    tokens = register_tokens(client)
+    user_id = auth.decode_token(tokens["access_token"], "access").user_id
+    db = SessionLocal()
+    try:
+        db.query(models.User).filter(models.User.id == user_id).delete()
+        db.commit()
+    finally:
+        db.close()
+    assert client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
@@ -0,0 +1,93 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+from backup import backup_to_directory, iter_backup_ndjson
+from database import SQLALCHEMY_DATABASE_URL
+
+from helpers import expire, file_id, purge_expired, upload
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Restore runs in its own process so it gets a database of its own, with
+# foreign keys enforced the way Postgres would
+RESTORE = """
+import sys
+sys.path.insert(0, sys.argv[1])
+import database
+database.SQLITE_PRAGMAS["foreign_keys"] = "ON"
+import backup
+database.migrate_schema()
+backup.restore_from_directory(sys.argv[2])
+"""
+
+QUERIES = {
+    "files": "SELECT id, filename, parent_id, path, version, content_hash, trashed_at IS NOT NULL FROM files ORDER BY id",
+    "file_versions": "SELECT file_id, version, content_hash FROM file_versions ORDER BY file_id, version",
+    "blobs": "SELECT hash, size FROM blobs ORDER BY hash",
+    "users": "SELECT id, email, role FROM users ORDER BY id",
+}
+
+def dump(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {table: conn.execute(query).fetchall() for table, query in QUERIES.items()}
+    finally:
+        conn.close()
+
+def restore(directory, tmp_path):
+    target = tmp_path / "restored"
+    target.mkdir()
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{target / 'restored.db'}"}
+    subprocess.run([sys.executable, "-c", RESTORE, BACKEND, str(directory)], env=env, cwd=target, check=True,
+                   capture_output=True)
+    return dump(target / "restored.db")
+
+
+def test_incremental_backups_restore_to_the_same_state(client, register, tmp_path):
+    teacher = register()
+    folder = client.post("/folders/create", json={"name": "backed up"}, headers=teacher).json()["id"]
+    upload(client, teacher, "a.txt", b"a1", parent_id=folder)
+    upload(client, teacher, "gone.txt", b"gone")
+    directory = tmp_path / "backup"
+    backup_to_directory(str(directory))
+
+    # Changes after the full backup: a new version, a purged folder, a purged file
+    # whose id is then reused, and an item left in the trash
+    upload(client, teacher, "a.txt", b"a2", parent_id=folder)
+    doomed = client.post("/folders/create", json={"name": "doomed"}, headers=teacher).json()["id"]
+    upload(client, teacher, "inside.txt", b"inside", parent_id=doomed)
+    client.delete(f"/files/delete/{doomed}", headers=teacher)
+    expire(doomed)
+    purge_expired()
+    gone = file_id(client, teacher, "gone.txt")
+    client.delete(f"/files/delete/{gone}", headers=teacher)
+    expire(gone)
+    purge_expired()
+    upload(client, teacher, "new.txt", b"new")
+    upload(client, teacher, "binned.txt", b"binned")
+    client.delete(f"/files/delete/{file_id(client, teacher, 'binned.txt')}", headers=teacher)
+    backup_to_directory(str(directory))
+
+    assert len(os.listdir(directory / "snapshots")) == 2
+    assert restore(directory, tmp_path) == dump(SQLALCHEMY_DATABASE_URL[len("sqlite:///"):])
+
+
+def test_backup_endpoint_is_admin_only(client, register, tmp_path):
+    assert client.get("/admin/backup", headers=register()).status_code == 403
+
+    # Admins are created from the command line only
+    email = f"admin-{os.getpid()}@example.com"
+    env = {**os.environ, "ADMIN_PASSWORD": "password"}
+    subprocess.run([sys.executable, os.path.join(BACKEND, "manage.py"), "create-admin", email], env=env,
+                   check=True, capture_output=True)
+    token = client.post("/auth/login", json={"email": email, "password": "password"}).json()["access_token"]
+
+    lines = [json.loads(line) for line in client.get(
+        "/admin/backup", headers={"Authorization": f"Bearer {token}"}
+    ).text.splitlines()]
+    assert {line["type"] for line in lines} >= {"row", "blob", "until"}
+    assert lines[-1]["type"] == "until"
+    assert [line["type"] for line in lines[:-1]] == [line["type"] for line in map(json.loads, iter_backup_ndjson())][:-1]
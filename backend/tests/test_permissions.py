@@ -0,0 +1,69 @@
+import uuid
+
+from helpers import file_id, upload
+
+
+def new_email():
+    return f"{uuid.uuid4().hex[:12]}@example.com"
+
+def course_with(client, teacher, *emails):
+    course = client.post("/courses/create", json={"name": "Lathe basics"}, headers=teacher).json()["id"]
+    for email in emails:
+        assert client.post(f"/courses/{course}/members", json={"email": email}, headers=teacher).status_code == 200
+    return course
+
+
+def test_students_cannot_reach_each_others_files(client, register):
+    alice, bob = register("student"), register("student")
+    upload(client, alice, "homework.txt", b"alice's answers")
+    item_id = file_id(client, alice, "homework.txt")
+
+    assert client.get("/files/list", headers=bob).json() == []
+    assert client.get(f"/files/download/{item_id}", headers=bob).status_code == 404
+    assert client.get(f"/files/versions/{item_id}", headers=bob).status_code == 404
+    assert client.delete(f"/files/delete/{item_id}", headers=bob).status_code == 404
+    assert client.post(f"/files/rename/{item_id}", json={"name": "mine.txt"}, headers=bob).status_code == 404
+    assert client.post(f"/files/copy/{item_id}", json={}, headers=bob).status_code == 404
+    assert client.get(f"/files/download/{item_id}", headers=alice).content == b"alice's answers"
+
+
+def test_course_members_read_shared_folders_but_only_teachers_write(client, register):
+    teacher = register()
+    student_email, outsider = new_email(), register("student")
+    student = register("student", email=student_email)
+    course = course_with(client, teacher, student_email)
+    folder = client.post("/folders/create", json={"name": "handouts"}, headers=teacher).json()["id"]
+    upload(client, teacher, "sheet.txt", b"sheet", parent_id=folder)
+    assert client.post(f"/files/share/{folder}", json={"course_id": course}, headers=teacher).status_code == 200
+    item_id = file_id(client, teacher, "sheet.txt", folder)
+
+    assert [i["name"] for i in client.get("/files/list", params={"parent_id": folder}, headers=student).json()] == ["sheet.txt"]
+    assert client.get(f"/files/download/{item_id}", headers=student).content == b"sheet"
+    # Reading a course folder does not allow changing it
+    assert client.delete(f"/files/delete/{item_id}", headers=student).status_code == 404
+    assert upload(client, student, "spam.exe", b"x", parent_id=folder).status_code == 404
+    assert client.post("/folders/create", json={"name": "spam", "parent_id": folder}, headers=student).status_code == 404
+    assert upload(client, student, "sheet.txt", b"overwritten", parent_id=folder).status_code == 404
+    assert client.get(f"/files/download/{item_id}", headers=student).content == b"sheet"
+
+    assert client.get("/files/list", params={"parent_id": folder}, headers=outsider).json() == []
+    assert client.get(f"/files/download/{item_id}", headers=outsider).status_code == 404
+
+
+def test_course_membership_is_managed_by_course_teachers(client, register):
+    teacher, other_teacher = register(), register()
+    student_email = new_email()
+    student = register("student", email=student_email)
+    course = course_with(client, teacher)
+
+    assert client.post(f"/courses/{course}/members", json={"email": student_email}, headers=other_teacher).status_code == 404
+    assert client.post(f"/courses/{course}/members", json={"email": student_email}, headers=student).status_code == 403
+    assert client.post("/courses/create", json={"name": "mine"}, headers=student).status_code == 403
+    assert client.get("/courses/list", headers=student).json() == []
+    folder = client.post("/folders/create", json={"name": "private"}, headers=other_teacher).json()["id"]
+    assert client.post(f"/files/share/{folder}", json={"course_id": course}, headers=other_teacher).status_code == 404
+
+
+def test_requests_without_a_valid_token_are_rejected(client):
+    assert client.get("/files/list").status_code == 401
+    assert client.get("/files/list", headers={"Authorization": "Bearer not-a-token"}).status_code == 401
@@ -0,0 +1,58 @@
+import uuid
+
+from starlette.requests import Request
+import pytest
+
+import ratelimit
+import state
+
+
+@pytest.fixture(autouse=True)
+def fresh_buckets(monkeypatch):
+    # Every test starts with full buckets and leaves the other tests' logins alone
+    monkeypatch.setattr(state, "_state", state.MemoryState())
+
+
+def login(client, email, password="wrong", headers=None):
+    return client.post("/auth/login", json={"email": email, "password": password}, headers=headers)
+
+
+def test_repeated_failures_lock_the_account(client, register):
+    email = f"{uuid.uuid4().hex[:12]}@example.com"
+    register("student", email=email)
+    for _ in range(ratelimit.LOGIN_BURST_PER_ACCOUNT):
+        assert login(client, email).status_code == 401
+
+    response = login(client, email, "password")
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    # Other accounts are unaffected
+    assert login(client, "someone-else@example.com").status_code == 401
+
+
+def test_one_address_cannot_spray_many_accounts(client):
+    for i in range(ratelimit.LOGIN_BURST_PER_IP):
+        assert login(client, f"guess{i}@example.com").status_code == 401
+    assert login(client, "guess-last@example.com").status_code == 429
+
+
+def test_forged_forwarded_for_does_not_reset_the_limit(client):
+    # No trusted proxy configured: the header is ignored
+    for i in range(ratelimit.LOGIN_BURST_PER_IP):
+        login(client, f"spoof{i}@example.com", headers={"X-Forwarded-For": f"10.0.0.{i}"})
+    assert login(client, "spoof@example.com", headers={"X-Forwarded-For": "10.0.0.99"}).status_code == 429
+
+
+@pytest.mark.parametrize("hops, forwarded, expected", [
+    (0, "1.1.1.1", "127.0.0.9"),
+    (1, "6.6.6.6, 1.1.1.1", "1.1.1.1"),
+    (2, "6.6.6.6, 1.1.1.1, 10.0.0.2", "1.1.1.1"),
+    # Fewer entries than proxies: the leftmost is the best there is
+    (2, "1.1.1.1", "1.1.1.1"),
+])
+def test_client_ip_comes_from_the_trusted_end_of_the_header(monkeypatch, hops, forwarded, expected):
+    monkeypatch.setattr(ratelimit, "TRUSTED_PROXY_HOPS", hops)
+    request = Request({
+        "type": "http", "headers": [(b"x-forwarded-for", forwarded.encode())], "client": ("127.0.0.9", 1234)
+    })
+    assert ratelimit.client_ip(request) == expected
@@ -0,0 +1,13 @@
+import pytest
+
+import state
+
+
+def test_several_workers_need_shared_state(monkeypatch):
+    monkeypatch.setattr(state, "STATE_BACKEND_URL", "")
+    state.check_workers(1)
+    with pytest.raises(SystemExit):
+        state.check_workers(2)
+
+    monkeypatch.setattr(state, "STATE_BACKEND_URL", "redis://localhost:6379/0")
+    state.check_workers(8)
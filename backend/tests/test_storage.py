@@ -0,0 +1,121 @@
+import io
+import os
+import time
+import uuid
+
+from fastapi import FastAPI, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+import pytest
+
+import files
+from storage import STALE_TEMP_SECONDS, TEMP_PREFIX, GridFSStorage, LocalStorage
+
+# Both backends of the files router run the same tests. GridFS needs a MongoDB
+# server: set MONGO_URL to run those, each in a throwaway database.
+
+
+@pytest.fixture(params=["local", "gridfs"])
+def files_app(request, tmp_path):
+    app = FastAPI()
+    app.include_router(files.router, prefix="/api/files")
+    app.add_middleware(files.UploadLimitMiddleware, path="/api/files/upload")
+    mongo_url = os.getenv("MONGO_URL")
+    if request.param == "gridfs" and not mongo_url:
+        pytest.skip("GridFS tests need MONGO_URL")
+
+    with TestClient(app) as client:
+        if request.param == "local":
+            app.state.files_storage = LocalStorage(str(tmp_path / "uploads"))
+        else:
+            from motor.motor_asyncio import AsyncIOMotorClient
+
+            # Created on the client's event loop, which Motor binds to
+            mongo = client.portal.call(AsyncIOMotorClient, mongo_url)
+            db_name = f"files_test_{uuid.uuid4().hex[:8]}"
+            app.state.files_storage = GridFSStorage(mongo[db_name])
+        client.portal.call(app.state.files_storage.ensure_indexes)
+        yield client
+        if request.param == "gridfs":
+            client.portal.call(mongo.drop_database, db_name)
+
+def save(client, name, body):
+    # Straight to the backend, skipping the route's exists() check, like a racing upload
+    upload = UploadFile(io.BytesIO(body), filename=name)
+    return client.portal.call(client.app.state.files_storage.save, name, upload)
+
+
+def test_upload_list_download_delete(files_app):
+    body = os.urandom(3 * 1024 * 1024 + 17)
+    response = files_app.post("/api/files/upload", files={"file": ("big.bin", body)})
+    assert response.status_code == 200
+
+    assert [f["name"] for f in files_app.get("/api/files/list").json()] == ["big.bin"]
+    assert files_app.get("/api/files/download/big.bin").content == body
+
+    assert files_app.delete("/api/files/delete/big.bin").status_code == 200
+    assert files_app.get("/api/files/list").json() == []
+    assert files_app.get("/api/files/download/big.bin").status_code == 404
+    assert files_app.delete("/api/files/delete/big.bin").status_code == 404
+
+
+def test_range_requests(files_app):
+    body = bytes(range(256)) * 8192
+    files_app.post("/api/files/upload", files={"file": ("range.bin", body)})
+
+    response = files_app.get("/api/files/download/range.bin", headers={"Range": "bytes=1048570-1048585"})
+    assert response.status_code == 206
+    assert response.content == body[1048570:1048586]
+    assert response.headers["content-range"] == f"bytes 1048570-1048585/{len(body)}"
+
+    response = files_app.get("/api/files/download/range.bin", headers={"Range": "bytes=-10"})
+    assert response.status_code == 206
+    assert response.content == body[-10:]
+
+    response = files_app.get("/api/files/download/range.bin", headers={"Range": f"bytes={len(body)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(body)}"
+
+
+def test_duplicate_names_are_rejected(files_app):
+    assert save(files_app, "dup.txt", b"first") == 5
+    with pytest.raises(HTTPException) as exc:
+        save(files_app, "dup.txt", b"second, longer")
+    assert exc.value.status_code == 400
+
+    # The losing upload left nothing behind and did not touch the stored file
+    assert [(f["name"], f["size"]) for f in files_app.portal.call(files_app.app.state.files_storage.list)] == [("dup.txt", 5)]
+    assert files_app.get("/api/files/download/dup.txt").content == b"first"
+    assert files_app.post("/api/files/upload", files={"file": ("dup.txt", b"again")}).status_code == 400
+
+
+def test_gridfs_duplicate_upload_aborts_its_chunks(files_app):
+    storage = files_app.app.state.files_storage
+    if not isinstance(storage, GridFSStorage):
+        pytest.skip("GridFS only")
+    save(files_app, "chunks.bin", b"x" * 600 * 1024)
+    with pytest.raises(HTTPException):
+        save(files_app, "chunks.bin", b"y" * 600 * 1024)
+    chunks = storage.files.database["uploads.chunks"]
+    # 600 KiB in 255 KiB chunks
+    assert files_app.portal.call(chunks.count_documents, {}) == 3
+
+
+def test_temp_names_are_reserved(files_app):
+    response = files_app.post("/api/files/upload", files={"file": (TEMP_PREFIX + "x", b"x")})
+    assert response.status_code == 400
+
+
+def test_stale_temp_files_are_removed_on_startup(tmp_path):
+    directory = tmp_path / "uploads"
+    directory.mkdir()
+    stale, fresh = directory / (TEMP_PREFIX + "stale"), directory / (TEMP_PREFIX + "fresh")
+    stale.write_bytes(b"s")
+    fresh.write_bytes(b"f")
+    old = time.time() - STALE_TEMP_SECONDS - 60
+    os.utime(stale, (old, old))
+
+    storage = LocalStorage(str(directory))
+    storage._remove_stale_temp_files()
+    assert sorted(os.listdir(directory)) == [fresh.name]
+    # Temp files are never listed as uploads
+    assert storage._list() == []
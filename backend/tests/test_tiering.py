@@ -0,0 +1,45 @@
+from datetime import timedelta
+import os
+
+import models
+import tiering
+
+from helpers import file_id, upload
+
+
+def test_cold_blobs_are_served_from_the_archive_and_promoted_on_read(client, register, session):
+    teacher = register()
+    body = os.urandom(tiering.TIER_MIN_COLD_SIZE)
+    upload(client, teacher, "lecture.bin", body)
+    item_id = file_id(client, teacher, "lecture.bin")
+    content_hash = session.query(models.DBFile.content_hash).filter(models.DBFile.id == item_id).scalar()
+    session.rollback()
+
+    # What tier_cold_blobs does for a blob not read since the cutoff
+    cutoff = models.utcnow() + timedelta(minutes=1)
+    client.portal.call(tiering.flush_access_stats)
+    assert tiering._archive(content_hash)
+    assert client.portal.call(tiering.run_write, tiering._demote, content_hash, cutoff) == 1
+    tiering.blob_cache._items.pop(content_hash, None)
+    assert session.query(models.FileBlob.tier).filter(models.FileBlob.hash == content_hash).scalar() == tiering.COLD
+    session.rollback()
+
+    assert client.get(f"/files/download/{item_id}", headers=teacher).content == body
+    client.portal.call(tiering.flush_access_stats)
+    blob = session.query(models.FileBlob).filter(models.FileBlob.hash == content_hash).one()
+    assert (blob.tier, blob.data, blob.access_count) == (tiering.HOT, body, 1)
+    assert not os.path.exists(tiering.archive_path(content_hash))
+
+
+def test_untracked_reads_bypass_the_cache(client, register, session):
+    teacher = register()
+    body = b"read by a backup " + teacher["Authorization"][-8:].encode()
+    upload(client, teacher, "quiet.txt", body)
+    content_hash = session.query(models.DBFile.content_hash).filter(
+        models.DBFile.id == file_id(client, teacher, "quiet.txt")
+    ).scalar()
+
+    assert tiering.load(session, content_hash, track=False) == body
+    assert tiering.blob_cache.get(content_hash) is None
+    assert tiering.load(session, content_hash) == body
+    assert tiering.blob_cache.get(content_hash) == body
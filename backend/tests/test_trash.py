@@ -0,0 +1,88 @@
+import json
+
+import models
+import tree
+from database import SessionLocal
+
+from helpers import expire, file_id, purge_expired, upload
+
+
+def test_delete_hides_the_subtree_until_restored(client, register):
+    teacher = register()
+    folder = client.post("/folders/create", json={"name": "unit 1"}, headers=teacher).json()["id"]
+    upload(client, teacher, "worksheet.txt", b"w", parent_id=folder)
+    item_id = file_id(client, teacher, "worksheet.txt", folder)
+
+    assert client.delete(f"/files/delete/{folder}", headers=teacher).status_code == 200
+    assert client.get("/files/list", headers=teacher).json() == []
+    assert client.get(f"/files/download/{item_id}", headers=teacher).status_code == 404
+    # Only the deleted item is listed; its contents come back with it
+    assert [i["id"] for i in client.get("/files/trash", headers=teacher).json()] == [folder]
+
+    assert client.post(f"/files/trash/{folder}/restore", headers=teacher).status_code == 200
+    assert client.get(f"/files/download/{item_id}", headers=teacher).content == b"w"
+    assert client.get("/files/trash", headers=teacher).json() == []
+
+
+def test_items_trashed_earlier_stay_in_trash(client, register):
+    teacher = register()
+    folder = client.post("/folders/create", json={"name": "unit 2"}, headers=teacher).json()["id"]
+    upload(client, teacher, "old.txt", b"o", parent_id=folder)
+    upload(client, teacher, "keep.txt", b"k", parent_id=folder)
+    client.delete(f"/files/delete/{file_id(client, teacher, 'old.txt', folder)}", headers=teacher)
+    client.delete(f"/files/delete/{folder}", headers=teacher)
+
+    client.post(f"/files/trash/{folder}/restore", headers=teacher)
+    assert [i["name"] for i in client.get("/files/list", params={"parent_id": folder}, headers=teacher).json()] == ["keep.txt"]
+
+
+def test_trashed_names_can_be_reused(client, register):
+    teacher = register()
+    upload(client, teacher, "essay.txt", b"old")
+    old_id = file_id(client, teacher, "essay.txt")
+    client.delete(f"/files/delete/{old_id}", headers=teacher)
+
+    assert upload(client, teacher, "essay.txt", b"new").json()["version"] == 1
+    new_id = file_id(client, teacher, "essay.txt")
+    assert new_id != old_id
+    # Restoring would now clash with the live file
+    assert client.post(f"/files/trash/{old_id}/restore", headers=teacher).status_code == 409
+
+    # Startup's duplicate repair ignores trashed rows
+    tree.rename_duplicate_siblings()
+    db = SessionLocal()
+    try:
+        names = dict(db.query(models.DBFile.id, models.DBFile.filename).filter(models.DBFile.id.in_([old_id, new_id])))
+    finally:
+        db.close()
+    assert names == {old_id: "essay.txt", new_id: "essay.txt"}
+
+
+def test_purge_removes_rows_versions_and_orphaned_blobs(client, register, session):
+    teacher = register()
+    folder = client.post("/folders/create", json={"name": "archive"}, headers=teacher).json()["id"]
+    sub = client.post("/folders/create", json={"name": "deep", "parent_id": folder}, headers=teacher).json()["id"]
+    body = b"only here " + teacher["Authorization"][-8:].encode()
+    upload(client, teacher, "a.txt", body, parent_id=sub)
+    upload(client, teacher, "a.txt", body + b"!", parent_id=sub)
+    item_id = file_id(client, teacher, "a.txt", sub)
+    # Shares its contents with a file outside the trash
+    upload(client, teacher, "copy.txt", body)
+    hashes = {v.content_hash for v in session.query(models.FileVersion).filter(models.FileVersion.file_id == item_id)}
+    session.rollback()
+
+    client.delete(f"/files/delete/{folder}", headers=teacher)
+    purge_expired()
+    assert session.query(models.DBFile).filter(models.DBFile.id == folder).count() == 1
+    session.rollback()
+
+    expire(folder)
+    purge_expired()
+    assert session.query(models.DBFile).filter(models.DBFile.id.in_([folder, sub, item_id])).count() == 0
+    assert session.query(models.FileVersion).filter(models.FileVersion.file_id == item_id).count() == 0
+    remaining = {b.hash for b in session.query(models.FileBlob.hash).filter(models.FileBlob.hash.in_(hashes))}
+    assert len(remaining) == 1
+    assert client.get(f"/files/download/{file_id(client, teacher, 'copy.txt')}", headers=teacher).content == body
+    # Recorded for incremental backups
+    deleted = {json.loads(t.row_key) for t in session.query(models.Tombstone).filter(models.Tombstone.table_name == "files")}
+    assert {folder, sub, item_id} <= deleted
@@ -0,0 +1,121 @@
+import uuid
+
+from helpers import file_id, upload
+
+
+def unique(name):
+    # The root is one namespace for everyone
+    return f"{name}-{uuid.uuid4().hex[:8]}"
+
+def names(client, headers, parent_id=None):
+    params = {"parent_id": parent_id} if parent_id is not None else {}
+    return sorted(i["name"] for i in client.get("/files/list", params=params, headers=headers).json())
+
+def folder(client, headers, name, parent_id=None):
+    return client.post("/folders/create", json={"name": name, "parent_id": parent_id}, headers=headers).json()["id"]
+
+def shared_course(client, teacher, register):
+    email = f"{uuid.uuid4().hex[:12]}@example.com"
+    student = register("student", email=email)
+    course = client.post("/courses/create", json={"name": "Turning"}, headers=teacher).json()["id"]
+    client.post(f"/courses/{course}/members", json={"email": email}, headers=teacher)
+    return course, student
+
+
+def test_move_carries_the_whole_subtree(client, register):
+    teacher = register()
+    target = folder(client, teacher, unique("target"))
+    a = folder(client, teacher, "a", folder(client, teacher, unique("home")))
+    b = folder(client, teacher, "b", a)
+    upload(client, teacher, "deep.txt", b"deep", parent_id=b)
+
+    assert client.post(f"/files/move/{a}", json={"parent_id": target}, headers=teacher).status_code == 200
+    assert names(client, teacher, target) == ["a"]
+    assert client.get(f"/files/download/{file_id(client, teacher, 'deep.txt', b)}", headers=teacher).content == b"deep"
+
+    # Everything below the moved folder went with it, so deleting it reaches them all
+    client.delete(f"/files/delete/{target}", headers=teacher)
+    assert client.get("/files/list", params={"parent_id": b}, headers=teacher).json() == []
+
+
+def test_move_into_itself_or_onto_a_taken_name_is_refused(client, register):
+    teacher = register()
+    home = folder(client, teacher, unique("home"))
+    a = folder(client, teacher, "a", home)
+    b = folder(client, teacher, "b", a)
+    assert client.post(f"/files/move/{a}", json={"parent_id": b}, headers=teacher).status_code == 400
+    assert client.post(f"/files/move/{a}", json={"parent_id": a}, headers=teacher).status_code == 400
+
+    folder(client, teacher, "b", home)
+    assert client.post(f"/files/move/{b}", json={"parent_id": home}, headers=teacher).status_code == 409
+
+
+def test_moved_items_take_the_course_of_their_new_folder(client, register):
+    teacher = register()
+    course, student = shared_course(client, teacher, register)
+    shared = folder(client, teacher, unique("shared"))
+    client.post(f"/files/share/{shared}", json={"course_id": course}, headers=teacher)
+    private = folder(client, teacher, unique("private"))
+    upload(client, teacher, "notes.txt", b"notes", parent_id=private)
+
+    client.post(f"/files/move/{private}", json={"parent_id": shared}, headers=teacher)
+    assert len(names(client, student, shared)) == 1
+    assert names(client, student, private) == ["notes.txt"]
+
+    # And stop being readable by the course once moved out of it
+    client.post(f"/files/move/{private}", json={"parent_id": None}, headers=teacher)
+    assert names(client, student, shared) == []
+    assert client.get(f"/files/download/{file_id(client, teacher, 'notes.txt', private)}", headers=student).status_code == 404
+
+
+def test_students_cannot_move_their_files_into_a_course_folder(client, register):
+    teacher = register()
+    course, student = shared_course(client, teacher, register)
+    shared = folder(client, teacher, unique("shared"))
+    client.post(f"/files/share/{shared}", json={"course_id": course}, headers=teacher)
+    spam = unique("spam.txt")
+    upload(client, student, spam, b"x")
+
+    item_id = file_id(client, student, spam)
+    assert client.post(f"/files/move/{item_id}", json={"parent_id": shared}, headers=student).status_code == 404
+
+
+def test_rename(client, register):
+    teacher = register()
+    home = folder(client, teacher, unique("home"))
+    upload(client, teacher, "draft.txt", b"d", parent_id=home)
+    upload(client, teacher, "final.txt", b"f", parent_id=home)
+    item_id = file_id(client, teacher, "draft.txt", home)
+
+    assert client.post(f"/files/rename/{item_id}", json={"name": "final.txt"}, headers=teacher).status_code == 409
+    assert client.post(f"/files/rename/{item_id}", json={"name": "v2.txt"}, headers=teacher).json() == {"id": item_id, "name": "v2.txt"}
+    assert names(client, teacher, home) == ["final.txt", "v2.txt"]
+    assert client.get(f"/files/download/{item_id}", headers=teacher).content == b"d"
+
+
+def test_copy_duplicates_the_subtree_into_the_destination_course(client, register):
+    teacher = register()
+    course, student = shared_course(client, teacher, register)
+    home = folder(client, teacher, unique("home"))
+    src = folder(client, teacher, "src", home)
+    inner = folder(client, teacher, "inner", src)
+    upload(client, teacher, "a.txt", b"a", parent_id=inner)
+    shared = folder(client, teacher, unique("shared"))
+    client.post(f"/files/share/{shared}", json={"course_id": course}, headers=teacher)
+
+    copy_id = client.post(f"/files/copy/{src}", json={"parent_id": shared}, headers=teacher).json()["id"]
+    assert names(client, student, shared) == ["src"]
+    inner_copy = file_id(client, student, "inner", copy_id)
+    assert inner_copy != inner
+    copied_file = file_id(client, student, "a.txt", inner_copy)
+    assert client.get(f"/files/download/{copied_file}", headers=student).content == b"a"
+
+    # The copy is independent of the original
+    upload(client, teacher, "a.txt", b"changed", parent_id=inner)
+    assert client.get(f"/files/download/{copied_file}", headers=student).content == b"a"
+    assert [v["version"] for v in client.get(f"/files/versions/{copied_file}", headers=student).json()] == [1]
+
+    assert client.post(f"/files/copy/{src}", json={"parent_id": inner}, headers=teacher).status_code == 400
+    assert client.post(f"/files/copy/{src}", json={"parent_id": home}, headers=teacher).status_code == 409
+    assert client.post(f"/files/copy/{src}", json={"parent_id": home, "name": "src copy"}, headers=teacher).status_code == 200
+    assert names(client, teacher, home) == ["src", "src copy"]
@@ -0,0 +1,69 @@
+import models
+import versions
+
+from helpers import file_id, upload
+
+
+def test_uploading_same_name_adds_a_version(client, register):
+    teacher = register()
+    first = upload(client, teacher, "notes.txt", b"one").json()
+    second = upload(client, teacher, "notes.txt", b"two").json()
+    assert (first["version"], second["version"]) == (1, 2)
+
+    listing = client.get("/files/list", headers=teacher).json()
+    assert [i["name"] for i in listing] == ["notes.txt"]
+    item_id = listing[0]["id"]
+    # The response carries the list entry, so the client can show it straight away
+    assert second["item"] == listing[0]
+    assert client.get(f"/files/download/{item_id}", headers=teacher).content == b"two"
+    assert client.get(f"/files/download/{item_id}", params={"version": 1}, headers=teacher).content == b"one"
+    assert [v["version"] for v in client.get(f"/files/versions/{item_id}", headers=teacher).json()] == [2, 1]
+
+
+def test_restore_version_makes_old_contents_newest(client, register):
+    teacher = register()
+    upload(client, teacher, "draft.txt", b"first")
+    upload(client, teacher, "draft.txt", b"second")
+    item_id = file_id(client, teacher, "draft.txt")
+
+    response = client.post(f"/files/versions/{item_id}/restore/1", headers=teacher)
+    assert response.json() == {"id": item_id, "version": 3}
+    assert client.get(f"/files/download/{item_id}", headers=teacher).content == b"first"
+    assert client.post(f"/files/versions/{item_id}/restore/9", headers=teacher).status_code == 404
+
+
+def test_old_versions_beyond_retention_are_pruned(client, register, session, monkeypatch):
+    monkeypatch.setattr(versions, "FILE_VERSION_RETENTION", 2)
+    teacher = register()
+    for body in (b"v1", b"v2", b"v3", b"v4"):
+        upload(client, teacher, "log.txt", body)
+    item_id = file_id(client, teacher, "log.txt")
+
+    assert [v["version"] for v in client.get(f"/files/versions/{item_id}", headers=teacher).json()] == [4, 3]
+    # Contents no version refers to any more are gone too
+    hashes = {v.content_hash for v in session.query(models.FileVersion).filter(models.FileVersion.file_id == item_id)}
+    assert session.query(models.FileBlob).filter(models.FileBlob.hash.in_(hashes)).count() == 2
+    assert client.get(f"/files/download/{item_id}", params={"version": 1}, headers=teacher).status_code == 404
+
+
+def test_identical_contents_share_one_blob(client, register, session):
+    teacher = register()
+    body = b"same bytes " + teacher["Authorization"][-8:].encode()
+    upload(client, teacher, "a.txt", body)
+    upload(client, teacher, "b.txt", body)
+    hashes = {row.content_hash for row in session.query(models.DBFile.content_hash).filter(
+        models.DBFile.id.in_([file_id(client, teacher, "a.txt"), file_id(client, teacher, "b.txt")])
+    )}
+    assert len(hashes) == 1
+
+
+def test_upload_cannot_replace_a_folder_or_someone_elses_file(client, register):
+    teacher, other = register(), register()
+    client.post("/folders/create", json={"name": "reports"}, headers=teacher)
+    assert upload(client, teacher, "reports", b"x").status_code == 409
+
+    folder = client.post("/folders/create", json={"name": "shared"}, headers=teacher).json()["id"]
+    upload(client, teacher, "a.txt", b"mine", parent_id=folder)
+    # Not even visible to another user
+    assert upload(client, other, "a.txt", b"theirs", parent_id=folder).status_code == 404
+    assert client.get(f"/files/download/{file_id(client, teacher, 'a.txt', folder)}", headers=teacher).content == b"mine"
@@ -0,0 +1,279 @@
+from collections import OrderedDict
+from datetime import timedelta
+import asyncio
+import os
+import threading
+import time
+import zlib
+
+from sqlalchemy import bindparam, func, update
+
+from database import SessionLocal, run_write
+from state import acquire_lease
+import models
+
+# Storage tiers for blob contents.
+#
+#   memory  small, recently read blobs in a per-process LRU (keyed by hash, so never stale)
+#   hot     blobs.data in the database
+#   cold    zlib-compressed files under BLOB_ARCHIVE_DIR, blobs.data set to NULL
+#
+# Reads are counted in memory and written back in one batch every
+# ACCESS_FLUSH_INTERVAL seconds instead of once per download. Blobs not read for
+# TIER_COLD_AFTER_DAYS are moved to the cold tier by tier_cold_blobs; reading a
+# cold blob serves it from the archive and queues it to be promoted back to hot.
+# With several app hosts BLOB_ARCHIVE_DIR must be shared storage.
+
+BLOB_ARCHIVE_DIR = os.getenv("BLOB_ARCHIVE_DIR", "./blob_archive")
+TIER_COLD_AFTER_DAYS = int(os.getenv("TIER_COLD_AFTER_DAYS", 7))
+# Blobs below this size stay hot; archiving them saves next to nothing
+TIER_MIN_COLD_SIZE = int(os.getenv("TIER_MIN_COLD_SIZE", 64 * 1024))
+TIER_INTERVAL = int(os.getenv("TIER_INTERVAL", 60 * 60))
+TIER_BATCH_SIZE = int(os.getenv("TIER_BATCH_SIZE", 50))
+TIER_COMPRESSION_LEVEL = int(os.getenv("TIER_COMPRESSION_LEVEL", 6))
+ACCESS_FLUSH_INTERVAL = int(os.getenv("ACCESS_FLUSH_INTERVAL", 30))
+
+BLOB_CACHE_BYTES = int(os.getenv("BLOB_CACHE_BYTES", 64 * 1024 * 1024))
+BLOB_CACHE_MAX_ITEM = int(os.getenv("BLOB_CACHE_MAX_ITEM", 1024 * 1024))
+
+HOT = "hot"
+COLD = "cold"
+
+
+class BlobCache:
+    # LRU bounded by total bytes; shared by the event loop and threadpool readers
+    def __init__(self, max_bytes, max_item):
+        self.max_bytes = max_bytes
+        self.max_item = max_item
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_item:
+            return
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+blob_cache = BlobCache(BLOB_CACHE_BYTES, BLOB_CACHE_MAX_ITEM)
+
+
+# Access counters: hash -> reads since the last flush
+_access_counts = {}
+_pending_promotions = set()
+_counter_lock = threading.Lock()
+
+def _record_access(content_hash):
+    with _counter_lock:
+        _access_counts[content_hash] = _access_counts.get(content_hash, 0) + 1
+
+
+def archive_path(content_hash):
+    return os.path.join(BLOB_ARCHIVE_DIR, content_hash[:2], content_hash + ".z")
+
+def _read_archive(content_hash):
+    with open(archive_path(content_hash), "rb") as f:
+        return zlib.decompress(f.read())
+
+def _write_archive(content_hash, data):
+    path = archive_path(content_hash)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".partial", "wb") as f:
+        f.write(zlib.compress(data, TIER_COMPRESSION_LEVEL))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".partial", path)
+
+def _remove_archive(content_hash):
+    try:
+        os.remove(archive_path(content_hash))
+    except FileNotFoundError:
+        pass
+
+
+def load(db, content_hash, track=True):
+    # Contents of a blob from the fastest tier that has it; None if there is no such blob
+    data = blob_cache.get(content_hash)
+    if data is None:
+        for _ in range(2):
+            row = db.query(models.FileBlob.data, models.FileBlob.tier).filter(
+                models.FileBlob.hash == content_hash
+            ).first()
+            if row is None:
+                return None
+            if row.tier != COLD:
+                data = row.data or b""
+                break
+            try:
+                data = _read_archive(content_hash)
+            except FileNotFoundError:
+                # Promoted between the query and the read; the row has the data again
+                continue
+            if track:
+                with _counter_lock:
+                    _pending_promotions.add(content_hash)
+            break
+        if data is None:
+            return None
+        # Untracked reads (backups) touch every blob and would evict the hot ones
+        if track:
+            blob_cache.put(content_hash, data)
+    if track:
+        _record_access(content_hash)
+    return data
+
+
+def backfill_access_times():
+    # Blobs from before access tracking count as read now, so they go cold only after a full period
+    db = SessionLocal()
+    try:
+        db.query(models.FileBlob).filter(models.FileBlob.last_accessed_at.is_(None)).update(
+            {models.FileBlob.last_accessed_at: models.utcnow()}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _apply_access_counts(db, counts, accessed_at):
+    blobs = models.FileBlob.__table__
+    db.execute(
+        update(blobs).where(blobs.c.hash == bindparam("b_hash")).values(
+            access_count=func.coalesce(blobs.c.access_count, 0) + bindparam("b_count"),
+            last_accessed_at=accessed_at,
+        ),
+        [{"b_hash": h, "b_count": n} for h, n in counts.items()]
+    )
+
+def _promote(db, content_hash, data):
+    blobs = models.FileBlob
+    return db.query(blobs).filter(blobs.hash == content_hash, blobs.tier == COLD).update(
+        {blobs.data: data, blobs.tier: HOT}, synchronize_session=False
+    )
+
+async def flush_access_stats():
+    # One write transaction per interval for all reads, then promotions of cold blobs that were read
+    global _access_counts, _pending_promotions
+    loop = asyncio.get_running_loop()
+    with _counter_lock:
+        counts, _access_counts = _access_counts, {}
+        promotions, _pending_promotions = _pending_promotions, set()
+    if counts:
+        await run_write(_apply_access_counts, counts, models.utcnow())
+    for content_hash in promotions:
+        try:
+            data = await loop.run_in_executor(None, _read_archive, content_hash)
+        except FileNotFoundError:
+            continue
+        if await run_write(_promote, content_hash, data):
+            await loop.run_in_executor(None, _remove_archive, content_hash)
+
+async def track_access():
+    while True:
+        await asyncio.sleep(ACCESS_FLUSH_INTERVAL)
+        try:
+            await flush_access_stats()
+        except Exception as e:
+            print(f"Flushing blob access stats failed: {str(e)}")
+
+
+def _cold_candidates(cutoff):
+    db = SessionLocal()
+    try:
+        blobs = models.FileBlob
+        return [row.hash for row in db.query(blobs.hash).filter(
+            func.coalesce(blobs.tier, HOT) == HOT,
+            blobs.data.isnot(None),
+            blobs.size >= TIER_MIN_COLD_SIZE,
+            blobs.last_accessed_at < cutoff
+        ).limit(TIER_BATCH_SIZE)]
+    finally:
+        db.close()
+
+def _archive(content_hash):
+    db = SessionLocal()
+    try:
+        data = db.query(models.FileBlob.data).filter(models.FileBlob.hash == content_hash).scalar()
+    finally:
+        db.close()
+    if data is None:
+        return False
+    _write_archive(content_hash, data)
+    return True
+
+def _demote(db, content_hash, cutoff):
+    # Only if it was not read (or promoted) since it was picked
+    blobs = models.FileBlob
+    return db.query(blobs).filter(
+        blobs.hash == content_hash,
+        func.coalesce(blobs.tier, HOT) == HOT,
+        blobs.last_accessed_at < cutoff
+    ).update({blobs.data: None, blobs.tier: COLD}, synchronize_session=False)
+
+def _sweep_archive():
+    # Archive files whose blob was deleted (prune_orphan_blobs) or promoted meanwhile
+    if not os.path.isdir(BLOB_ARCHIVE_DIR):
+        return
+    # Leave recent files alone: they may belong to a demotion that has not committed yet
+    cutoff = time.time() - TIER_INTERVAL
+    found = {}
+    for prefix in os.scandir(BLOB_ARCHIVE_DIR):
+        if not prefix.is_dir():
+            continue
+        for entry in os.scandir(prefix.path):
+            if entry.stat().st_mtime < cutoff:
+                found[entry.name.split(".")[0]] = entry.path
+    if not found:
+        return
+    db = SessionLocal()
+    try:
+        hashes = list(found)
+        cold = set()
+        for i in range(0, len(hashes), 500):
+            cold.update(row.hash for row in db.query(models.FileBlob.hash).filter(
+                models.FileBlob.hash.in_(hashes[i:i + 500]), models.FileBlob.tier == COLD
+            ))
+    finally:
+        db.close()
+    for content_hash, path in found.items():
+        if content_hash not in cold:
+            os.remove(path)
+
+async def tier_cold_blobs():
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(TIER_INTERVAL)
+        # With several workers only the lease holder moves blobs between tiers
+        if not await acquire_lease("blob-tiering", max(TIER_INTERVAL - 1, 1)):
+            continue
+        try:
+            # Counters still held in memory would otherwise make recently read blobs look cold
+            await flush_access_stats()
+            cutoff = models.utcnow() - timedelta(days=TIER_COLD_AFTER_DAYS)
+            demoted = True
+            while demoted:
+                demoted = 0
+                for content_hash in await loop.run_in_executor(None, _cold_candidates, cutoff):
+                    # Write the archive copy before dropping the hot one
+                    if not await loop.run_in_executor(None, _archive, content_hash):
+                        continue
+                    if await run_write(_demote, content_hash, cutoff):
+                        demoted += 1
+                    else:
+                        await loop.run_in_executor(None, _remove_archive, content_hash)
+            await loop.run_in_executor(None, _sweep_archive)
+        except Exception as e:
+            print(f"Blob tiering failed: {str(e)}")
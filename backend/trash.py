@@ -0,0 +1,105 @@
+from datetime import timedelta
+import asyncio
+import os
+
+from sqlalchemy import func
+
+from backup import record_deletions
+from blobstore import prune_orphan_blobs
+from database import SessionLocal, engine, run_write
+from state import acquire_lease
+from tree import subtree_filter
+import models
+
+# Soft delete for files and folders.
+# Deleting marks the item and everything below it as trashed in one statement over
+# the path index, so it costs the same whatever the size of the tree. Trashed items
+# are hidden by the permission predicates, can be restored for TRASH_RETENTION_DAYS,
+# and are then removed for good by purge_expired_trash in small batches.
+
+TRASH_RETENTION_DAYS = int(os.getenv("TRASH_RETENTION_DAYS", 30))
+TRASH_PURGE_INTERVAL = int(os.getenv("TRASH_PURGE_INTERVAL", 10 * 60))
+# Rows removed per write transaction, and the pause between transactions so
+# purging never holds the write lock for long
+TRASH_PURGE_BATCH_SIZE = int(os.getenv("TRASH_PURGE_BATCH_SIZE", 200))
+TRASH_PURGE_PAUSE = float(os.getenv("TRASH_PURGE_PAUSE_SECONDS", 0.2))
+
+def retention():
+    return timedelta(days=TRASH_RETENTION_DAYS)
+
+
+def trash_subtree(db, item_id: int, path: str):
+    # Items trashed earlier keep their own trash root, so restoring this one leaves them in the trash
+    files = models.DBFile
+    db.query(files).filter(subtree_filter(path), files.trashed_at.is_(None)).update(
+        {files.trashed_at: models.utcnow(), files.trash_root_id: item_id}, synchronize_session=False
+    )
+
+def restore_subtree(db, item_id: int, path: str):
+    files = models.DBFile
+    db.query(files).filter(subtree_filter(path), files.trash_root_id == item_id).update(
+        {files.trashed_at: None, files.trash_root_id: None}, synchronize_session=False
+    )
+
+
+def drop_legacy_name_index():
+    # Replaced by the partial uq_files_live_parent_filename
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX IF EXISTS uq_files_parent_filename")
+
+
+def _next_purge_batch(db, path: str):
+    # Deepest rows first, so no row is removed before its children
+    files = models.DBFile
+    return [row.id for row in db.query(files.id).filter(subtree_filter(path)).order_by(
+        func.length(files.path).desc()
+    ).limit(TRASH_PURGE_BATCH_SIZE)]
+
+def _purge_batch(db, ids):
+    versions = db.query(models.FileVersion).filter(models.FileVersion.file_id.in_(ids))
+    version_rows = versions.with_entities(models.FileVersion.id, models.FileVersion.content_hash).all()
+    hashes = {row.content_hash for row in version_rows}
+    hashes |= {row.content_hash for row in db.query(models.DBFile.content_hash).filter(models.DBFile.id.in_(ids))}
+    versions.delete(synchronize_session=False)
+    db.query(models.DBFile).filter(models.DBFile.id.in_(ids)).delete(synchronize_session=False)
+    # Incremental backups replay these deletions
+    record_deletions(db, models.FileVersion, [row.id for row in version_rows])
+    record_deletions(db, models.DBFile, ids)
+    prune_orphan_blobs(db, hashes)
+
+def _expired_roots():
+    db = SessionLocal()
+    try:
+        files = models.DBFile
+        return db.query(files.id, files.path).filter(
+            files.trash_root_id == files.id,
+            files.trashed_at < models.utcnow() - retention()
+        ).all()
+    finally:
+        db.close()
+
+def _batch_for(path):
+    db = SessionLocal()
+    try:
+        return _next_purge_batch(db, path)
+    finally:
+        db.close()
+
+async def purge_expired_trash():
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(TRASH_PURGE_INTERVAL)
+        # With several workers only the lease holder purges
+        if not await acquire_lease("trash-purge", max(TRASH_PURGE_INTERVAL - 1, 1)):
+            continue
+        try:
+            for root in await loop.run_in_executor(None, _expired_roots):
+                while True:
+                    ids = await loop.run_in_executor(None, _batch_for, root.path)
+                    if not ids:
+                        break
+                    # Through the write queue, one small transaction at a time
+                    await run_write(_purge_batch, ids)
+                    await asyncio.sleep(TRASH_PURGE_PAUSE)
+        except Exception as e:
+            print(f"Purging trash failed: {str(e)}")
@@ -0,0 +1,80 @@
+from sqlalchemy import String, and_, cast, func, literal, select
+from sqlalchemy.orm import aliased
+
+from database import SessionLocal, engine
+import models
+
+# Helpers for the materialized path hierarchy index (DBFile.path).
+
+def child_path(parent_path, item_id: int) -> str:
+    return f"{parent_path or '/'}{item_id}/"
+
+def subtree_filter(path: str):
+    # Everything whose path starts with `path`, written as a range so it uses the index:
+    # "0" is the character right after "/", so "/4/17/" <= p < "/4/170" matches "/4/17/..." only.
+    # Needs byte order comparison, see models.PATH_TYPE
+    return and_(models.DBFile.path >= path, models.DBFile.path < path[:-1] + "0")
+
+def is_within(path: str, ancestor_path: str) -> bool:
+    return path.startswith(ancestor_path)
+
+def rebase_subtree(db, old_path: str, new_path: str):
+    # Rewrites the path prefix of a whole subtree in one statement
+    db.query(models.DBFile).filter(subtree_filter(old_path)).update(
+        {models.DBFile.path: literal(new_path, String).concat(func.substr(models.DBFile.path, len(old_path) + 1))},
+        synchronize_session=False
+    )
+
+def use_byte_order_paths():
+    # Postgres databases created before path had the "C" collation; changing it rebuilds the index
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        collation = conn.exec_driver_sql(
+            "SELECT collation_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = 'files' AND column_name = 'path'"
+        ).scalar()
+        if collation != "C":
+            conn.exec_driver_sql('ALTER TABLE files ALTER COLUMN path TYPE VARCHAR COLLATE "C"')
+
+def backfill_paths():
+    # Fills in paths for rows created before the hierarchy index existed, one tree level per pass
+    db = SessionLocal()
+    try:
+        files = models.DBFile
+        parent = aliased(models.DBFile)
+        db.query(files).filter(files.path.is_(None), files.parent_id.is_(None)).update(
+            {files.path: "/" + cast(files.id, String) + "/"}, synchronize_session=False
+        )
+        while True:
+            parent_path = select(parent.path).where(parent.id == files.parent_id).scalar_subquery()
+            updated = db.query(files).filter(
+                files.path.is_(None),
+                files.parent_id.in_(select(parent.id).where(parent.path.isnot(None)))
+            ).update({files.path: parent_path + cast(files.id, String) + "/"}, synchronize_session=False)
+            if not updated:
+                break
+        db.commit()
+    finally:
+        db.close()
+
+def rename_duplicate_siblings():
+    # uq_files_live_parent_filename cannot be built while older live rows share a name in
+    # the same folder. Trashed rows are outside the index and keep their names.
+    db = SessionLocal()
+    try:
+        files = models.DBFile
+        parent_key = func.coalesce(files.parent_id, 0)
+        live = files.trashed_at.is_(None)
+        duplicates = db.query(parent_key, files.filename).filter(live).group_by(
+            parent_key, files.filename
+        ).having(func.count() > 1).all()
+        for parent, filename in duplicates:
+            rows = db.query(files).filter(
+                parent_key == parent, files.filename == filename, live
+            ).order_by(files.id).all()
+            for row in rows[1:]:
+                row.filename = f"{row.filename} ({row.id})"
+        db.commit()
+    finally:
+        db.close()
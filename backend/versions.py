@@ -0,0 +1,51 @@
+import os
+
+from sqlalchemy import exists, func, insert, select
+
+from backup import record_deletions
+from blobstore import prune_orphan_blobs
+from database import SessionLocal
+import models
+
+# How many versions (including the current one) are kept per file
+FILE_VERSION_RETENTION = int(os.getenv("FILE_VERSION_RETENTION", 10))
+
+def record_version(db, file_id, version, content_hash, size, content_type, user_id):
+    db.add(models.FileVersion(
+        file_id=file_id,
+        version=version,
+        content_hash=content_hash,
+        size=size,
+        content_type=content_type,
+        uploaded_by=user_id
+    ))
+    if FILE_VERSION_RETENTION > 0:
+        expired = db.query(models.FileVersion.id, models.FileVersion.content_hash).filter(
+            models.FileVersion.file_id == file_id,
+            models.FileVersion.version <= version - FILE_VERSION_RETENTION
+        ).all()
+        if expired:
+            db.query(models.FileVersion).filter(
+                models.FileVersion.id.in_([v.id for v in expired])
+            ).delete(synchronize_session=False)
+            record_deletions(db, models.FileVersion, [v.id for v in expired])
+            db.flush()
+            prune_orphan_blobs(db, [v.content_hash for v in expired])
+
+def backfill_versions():
+    # Every file keeps a version entry for its current contents; older rows predate that
+    db = SessionLocal()
+    try:
+        files = models.DBFile
+        has_version = exists().where(models.FileVersion.file_id == files.id)
+        db.execute(insert(models.FileVersion).from_select(
+            ["file_id", "version", "content_hash", "size", "content_type", "uploaded_by", "created_at"],
+            select(
+                files.id, func.coalesce(files.version, 1), files.content_hash,
+                files.size, files.content_type, files.owner_id, func.current_timestamp()
+            ).where(files.is_folder == False, files.content_hash.isnot(None), ~has_version)
+        ))
+        db.query(files).filter(files.version.is_(None)).update({files.version: 1}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
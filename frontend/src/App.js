@@ -1,6 +1,7 @@
 import React, { useState, createContext } from 'react';
 import { BrowserRouter as Router, Routes, Route, Navigate } from 'react-router-dom';
 import { Toaster } from 'sonner';
+import axios from 'axios';
 
 // Pages
 import HomePage from './pages/HomePage';
@@ -15,6 +16,36 @@ import Lathe3DModel from './pages/Lathe3DModel';
 export const AuthContext = createContext();
 export const API = process.env.REACT_APP_API_URL || 'http://127.0.0.1:8000'; // Base URL for backend API
 
+const getSavedUser = () => JSON.parse(localStorage.getItem('user') || 'null');
+
+// Attach the access token to every backend request
+axios.interceptors.request.use((config) => {
+  const savedUser = getSavedUser();
+  if (savedUser?.access_token && config.url?.startsWith(API)) {
+    config.headers.Authorization = `Bearer ${savedUser.access_token}`;
+  }
+  return config;
+});
+
+// Access tokens are short lived: renew once with the refresh token, then retry
+axios.interceptors.response.use(undefined, async (error) => {
+  const original = error.config;
+  const savedUser = getSavedUser();
+  if (
+    error.response?.status === 401 &&
+    savedUser?.refresh_token &&
+    original &&
+    !original._retried &&
+    !original.url.endsWith('/auth/refresh')
+  ) {
+    original._retried = true;
+    const response = await axios.post(`${API}/auth/refresh`, { refresh_token: savedUser.refresh_token });
+    localStorage.setItem('user', JSON.stringify({ ...savedUser, ...response.data }));
+    return axios(original);
+  }
+  return Promise.reject(error);
+});
+
 function App() {
   // Initialize user from localStorage to persist session
   const [user, setUser] = useState(() => {
@@ -0,0 +1,69 @@
+import { useEffect, useRef } from 'react';
+import { API } from '../App';
+
+// Listing updates shared by the event stream and the page's own writes. A page applies
+// the response of its own writes too: the event may come late, or not at all when the
+// server runs without a shared event channel.
+export const upsertItem = (items, item) => [...items.filter((i) => i.id !== item.id), item];
+export const removeItem = (items, id) => items.filter((i) => i.id !== id);
+
+// Keeps a folder listing current by applying the server's change events
+// (GET /files/events) instead of re-fetching the whole folder after every write.
+// `resync` re-lists the folder; it runs when the stream reconnects or the server
+// says this client fell behind.
+export function useFolderEvents(folderId, setItems, resync) {
+  const resyncRef = useRef(resync);
+  resyncRef.current = resync;
+
+  useEffect(() => {
+    let source = null;
+    let retryTimer = null;
+    let opened = false;
+
+    const apply = (event) => {
+      switch (event.type) {
+        case 'added':
+        case 'updated':
+          setItems((items) => upsertItem(items, event.item));
+          break;
+        case 'renamed':
+          setItems((items) => items.map((i) => (i.id === event.id ? { ...i, name: event.name } : i)));
+          break;
+        case 'removed':
+          setItems((items) => removeItem(items, event.id));
+          break;
+        default:
+          resyncRef.current();
+      }
+    };
+
+    const connect = () => {
+      const user = JSON.parse(localStorage.getItem('user') || 'null');
+      const params = new URLSearchParams({ access_token: user?.access_token || '' });
+      if (folderId) params.set('parent_id', folderId);
+
+      source = new EventSource(`${API}/files/events?${params}`);
+      source.onopen = () => {
+        // Events may have been missed while reconnecting
+        if (opened) resyncRef.current();
+        opened = true;
+      };
+      source.onmessage = (e) => apply(JSON.parse(e.data));
+      source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED) {
+          // Rejected, usually an expired token: re-listing renews it, then subscribe again
+          retryTimer = setTimeout(async () => {
+            await resyncRef.current();
+            connect();
+          }, 3000);
+        }
+      };
+    };
+
+    connect();
+    return () => {
+      clearTimeout(retryTimer);
+      source?.close();
+    };
+  }, [folderId, setItems]);
+}
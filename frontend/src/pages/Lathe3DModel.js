@@ -1,53 +1,60 @@
 import React, { useState } from 'react';
+import { API } from '../App';
+
+// Optimized variants are served by the backend (see backend/build_assets.py);
+// it picks AVIF/WebP from the Accept header and the width from ?w=, then redirects
+// to the content-hashed variant, which the browser caches for good
+const imageUrl = (name, width) => `${API}/assets/images/${name}${width ? `?w=${width}` : ''}`;
+const imageSrcSet = (name) => [320, 640, 1280].map((w) => `${imageUrl(name, w)} ${w}w`).join(', ');
 
 const LATHE_COMPONENTS = [
   {
     id: 1,
     name: "Control Panel (CNC Controller)",
     description: "Control Panel is known as the Brain of CNC machine. It is used to execute or run CNC programs written using G-Codes And M-codes. Operators can control whole machine processes using this control panel. Spindle speed, Feed rate, tool movements, and other machine operations were controlled using Control Panel. It also displays machine status, error messages and operation time. The control panel is essential because it allows us to accurate and automated control of the machine processes. ",
-    image: "./images/control_panel.png"
+    image: "control_panel.png"
   },
   {
     id: 2,
     name: "Spindle",
     description: "Spindle is the rotating component that drives the chuck and the workpiece. It rotates at different speed which can be controlled by using control panel programs. The spindle speed directly affects on the cutting quality and surface finish after the operation done. The spindle is important because it provide necessary rotational movements which required for different operations.",
-    image: "./images/spindle.png"
+    image: "spindle.png"
   },
   {
     id: 3,
     name: "Chuck",
     description: "Chuck is the mounted on the spindle and it only use to hold the workpiece properly during machining operations. Mostly the Three-jaw and Four-jaw type of chuck is used. A properly clamped workpiece ensures accurate machining and prevents slippage during operations. The chuck is essential for maintaining safety during operations.",
-    image: "./images/chuck.png"
+    image: "chuck.png"
   },
   {
     id: 4,
     name: "Tool post or Tool Turret",
     description: "The Tool post is use to hold one or more cutting tools. In CNC machines, The turret automatically indexes and changes the tools as per the program is given. This allows multiple operations which requires different tools are performed without manual efforts. The tool turret improves the productivity and working efficiency as well as reduces the worker fatigue.",
-    image: "./images/tool_post.png"
+    image: "tool_post.png"
   },
   {
     id: 5,
     name: "Bed",
     description: "Bed is the base structure of the CNC machine. It supports all the major components such as headstock, Tailstock, and Carriage. The bed provide rigid base and maintain alignment of machine parts. A strong and rigid bed is necessary to reduce the vibration causing during operations and ensure the accurate machining.",
-    image: "./images/bed.png"
+    image: "bed.png"
   },
   {
     id: 6,
     name: "Carriage",
     description: "The carriage moves all along the bed and carries the cutting tools during machining. It allows  controlled movement of the tool in longitudinal and transverse direction. The carriage is fully driven by Servo Motors for precise positioning. It plays important role in shaping the workpiece accurately.",
-    image: "./images/carriage.png"
+    image: "carriage.png"
   },
   {
     id: 7,
     name: "Tailstock",
     description: "The tailstock is located at the opposite side of the headstock and is used to support long workpieces. It can also hold drilling and boring tools. The tailstock improves stability of workpiece while being machining. And prevents bending of workpiece during operations.",
-    image: "./images/tailstock.png"
+    image: "tailstock.png"
   },
   {
     id: 8,
     name: "Safety Enclosure (Body)",
     description: "The safety enclosure is the main outer body of the machine which surrounds the machine area to protect the operator form falling chips, coolant splashes, and accidental contact caused by the moving parts. It is an important safety feature that completely ensure the safety and compliance with industrial safety standards.",
-    image: "./images/safety.png"
+    image: "safety.png"
   }
 ];
 
@@ -173,7 +180,11 @@ function Lathe3DModel() {
                   onClick={() => handleImageClick(component.image)}
                 >
                   <img
-                    src={component.image}
+                    src={imageUrl(component.image, 640)}
+                    srcSet={imageSrcSet(component.image)}
+                    sizes="(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw"
+                    loading="lazy"
+                    decoding="async"
                     alt={component.name}
                     className="w-full h-full object-contain p-2 transition-transform duration-500 group-hover:scale-110"
                   />
@@ -311,7 +322,7 @@ function Lathe3DModel() {
               </svg>
             </button>
             <img
-              src={selectedImage}
+              src={imageUrl(selectedImage)}
               alt="Full size"
               className="max-w-full max-h-[90vh] object-contain rounded-lg shadow-2xl border border-white/10"
               onClick={(e) => e.stopPropagation()}
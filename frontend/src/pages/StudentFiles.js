@@ -3,6 +3,7 @@ import { toast } from 'sonner';
 import { Link } from 'react-router-dom';
 import axios from 'axios';
 import { API } from '../App';
+import { useFolderEvents } from '../hooks/use-folder-events';
 
 function StudentFiles() {
   const [items, setItems] = useState([]);
@@ -27,6 +28,9 @@ function StudentFiles() {
     fetchFiles();
   }, [currentFolder]);
 
+  // Changes to the folder arrive as events, so it never needs polling
+  useFolderEvents(currentFolder?.id, setItems, fetchFiles);
+
   const openFolder = (folder) => {
     setFolderHistory([...folderHistory, folder]);
     setCurrentFolder(folder);
@@ -3,6 +3,7 @@ import { toast } from 'sonner';
 import { Link } from 'react-router-dom';
 import axios from 'axios';
 import { API } from '../App';
+import { removeItem, upsertItem, useFolderEvents } from '../hooks/use-folder-events';
 
 function TeacherFiles() {
   const [items, setItems] = useState([]);
@@ -27,6 +28,10 @@ function TeacherFiles() {
     fetchFiles();
   }, [currentFolder]);
 
+  // Changes by others arrive as events; this page's own writes are applied from their
+  // responses, so they show up even if the event is delivered late or not at all
+  useFolderEvents(currentFolder?.id, setItems, fetchFiles);
+
   /* New states for inline creation */
   const [isCreatingFolder, setIsCreatingFolder] = useState(false);
   const [newFolderName, setNewFolderName] = useState('');
@@ -36,14 +41,14 @@ function TeacherFiles() {
     if (!newFolderName.trim()) return;
 
     try {
-      await axios.post(`${API}/folders/create`, {
+      const response = await axios.post(`${API}/folders/create`, {
         name: newFolderName,
         parent_id: currentFolder?.id || null
       });
+      setItems((items) => upsertItem(items, response.data.item));
       toast.success("Folder created!");
       setIsCreatingFolder(false);
       setNewFolderName('');
-      fetchFiles();
     } catch (error) {
       toast.error("Failed to create folder.");
     }
@@ -59,9 +64,9 @@ function TeacherFiles() {
       }
 
       try {
-        await axios.post(`${API}/files/upload`, formData);
+        const response = await axios.post(`${API}/files/upload`, formData);
+        setItems((items) => upsertItem(items, response.data.item));
         toast.success(`File "${file.name}" uploaded.`);
-        fetchFiles();
       } catch (error) {
         toast.error(error.response?.data?.detail || 'File upload failed.');
       }
@@ -73,8 +78,8 @@ function TeacherFiles() {
     if (window.confirm(`Delete "${item.name}"? ${item.is_folder ? '(and all contents)' : ''}`)) {
       try {
         await axios.delete(`${API}/files/delete/${item.id}`);
+        setItems((items) => removeItem(items, item.id));
         toast.info("Item deleted.");
-        fetchFiles();
       } catch (error) {
         toast.error('Failed to delete.');
       }